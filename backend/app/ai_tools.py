@@ -1,10 +1,17 @@
+import functools
+import json
 import os
 import re
 import uuid
 from typing import Dict, Any, Optional, List
 
 from .db import get_pool
-from .query_engine import execute_python_query
+from .helpers import ensure_dict
+from .query_engine import (
+    execute_python_query, get_bigquery_client, get_sa_engine, invalidate_datastore_cache,
+    ping_bigquery, ping_postgres, ping_sql_engine, run_blocking, SA_TYPES,
+)
+from .storage import get_storage_provider
 
 
 def _row_to_dict(row) -> Dict[str, Any]:
@@ -323,13 +330,19 @@ async def get_board_code(board_id: str) -> Dict[str, Any]:
         return {"error": str(e)}
 
 
+@functools.lru_cache(maxsize=256)
+def _search_pattern(search_term: str) -> re.Pattern:
+    """Case-insensitive pattern for a search term; falls back to a literal match if it is not valid regex."""
+    try:
+        return re.compile(search_term, re.IGNORECASE)
+    except re.error:
+        return re.compile(re.escape(search_term), re.IGNORECASE)
+
+
 def _search_lines(code: str, search_term: str, context_lines: int = 3) -> tuple:
     """Search code string for a pattern. Returns (match_count, total_lines, snippets)."""
     lines = code.split("\n")
-    try:
-        pattern = re.compile(search_term, re.IGNORECASE)
-    except re.error:
-        pattern = re.compile(re.escape(search_term), re.IGNORECASE)
+    pattern = _search_pattern(search_term)
 
     match_indices = [i for i, line in enumerate(lines) if pattern.search(line)]
     if not match_indices:
@@ -558,6 +571,7 @@ async def create_or_update_datastore(
                 return {"success": True, "datastore_id": datastore_id, "message": "No changes specified"}
             params.append(datastore_id)
             await pool.execute(f"UPDATE datastores SET {', '.join(updates)} WHERE id = ${idx}", *params)
+            invalidate_datastore_cache(datastore_id)
             return {
                 "success": True, "action": "updated", "datastore_id": datastore_id,
                 "name": name or existing["name"],
@@ -592,9 +606,6 @@ async def create_or_update_datastore(
 
 async def test_datastore_tool(datastore_id: str) -> Dict[str, Any]:
     try:
-        from .helpers import ensure_dict
-        from .query_engine import get_bigquery_client, get_sa_engine, SA_TYPES
-
         pool = get_pool()
         row = await pool.fetchrow("SELECT * FROM datastores WHERE id = $1", datastore_id)
         if not row:
@@ -606,12 +617,12 @@ async def test_datastore_tool(datastore_id: str) -> Dict[str, Any]:
 
         if ds_type == "bigquery":
             client = await get_bigquery_client(ds_config)
-            list(client.list_datasets(max_results=1))
+            await run_blocking(ping_bigquery, client)
+        elif ds_type == "postgres" and ds_config.get("connection_string"):
+            await ping_postgres(ds_config["connection_string"])
         elif ds_type in SA_TYPES:
-            import sqlalchemy as sa
             engine = get_sa_engine(ds_type, ds_config)
-            with engine.connect() as conn:
-                conn.execute(sa.text("SELECT 1"))
+            await run_blocking(ping_sql_engine, engine)
         else:
             return {"success": False, "error": f"Unsupported type: {ds_type}"}
 
@@ -623,13 +634,11 @@ async def test_datastore_tool(datastore_id: str) -> Dict[str, Any]:
 async def save_keyfile_tool(json_content: str, user_id: Optional[str] = None, filename: str = "keyfile.json") -> Dict[str, Any]:
     """Save a JSON keyfile from chat to secure storage."""
     try:
-        import json as json_mod
-        json_mod.loads(json_content)
+        json.loads(json_content)
     except (ValueError, TypeError):
         return {"error": "Invalid JSON content. Please provide valid JSON."}
 
     try:
-        from .storage import get_storage_provider
         storage = get_storage_provider()
 
         if not user_id:
@@ -2,9 +2,9 @@ import os
 import time
 import bcrypt
 import jwt
-import httpx
 from fastapi import HTTPException, Request, Depends
 from .db import get_pool
+from .http_client import get_client
 
 JWT_SECRET = os.getenv("JWT_SECRET", "change-me-in-production")
 JWT_ALGORITHM = "HS256"
@@ -73,21 +73,21 @@ async def get_optional_user(request: Request):
 
 async def exchange_google_code(code: str, redirect_uri: str) -> dict:
     """Exchange Google OAuth authorization code for user info."""
-    async with httpx.AsyncClient() as client:
-        token_resp = await client.post(GOOGLE_TOKEN_URL, data={
-            "code": code,
-            "client_id": GOOGLE_CLIENT_ID,
-            "client_secret": GOOGLE_CLIENT_SECRET,
-            "redirect_uri": redirect_uri,
-            "grant_type": "authorization_code",
-        })
-        if token_resp.status_code != 200:
-            raise HTTPException(status_code=400, detail=f"Google token exchange failed: {token_resp.text}")
-        tokens = token_resp.json()
-
-        userinfo_resp = await client.get(GOOGLE_USERINFO_URL, headers={
-            "Authorization": f"Bearer {tokens['access_token']}"
-        })
-        if userinfo_resp.status_code != 200:
-            raise HTTPException(status_code=400, detail="Failed to fetch Google user info")
-        return userinfo_resp.json()
+    client = get_client()
+    token_resp = await client.post(GOOGLE_TOKEN_URL, data={
+        "code": code,
+        "client_id": GOOGLE_CLIENT_ID,
+        "client_secret": GOOGLE_CLIENT_SECRET,
+        "redirect_uri": redirect_uri,
+        "grant_type": "authorization_code",
+    })
+    if token_resp.status_code != 200:
+        raise HTTPException(status_code=400, detail=f"Google token exchange failed: {token_resp.text}")
+    tokens = token_resp.json()
+
+    userinfo_resp = await client.get(GOOGLE_USERINFO_URL, headers={
+        "Authorization": f"Bearer {tokens['access_token']}"
+    })
+    if userinfo_resp.status_code != 200:
+        raise HTTPException(status_code=400, detail="Failed to fetch Google user info")
+    return userinfo_resp.json()
@@ -1,18 +1,28 @@
 import os
-import json
 import asyncpg
+import orjson
 
 _pool: asyncpg.Pool | None = None
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://localhost:5432/nubi")
+# Keep a few connections warm so request paths skip the connect handshake
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Prepared statements cached per connection; set to 0 behind a transaction-mode pooler (pgbouncer)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+
+def _json_encode(value) -> str:
+    # asyncpg's text codec expects str, orjson produces bytes
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
 
 
 async def _init_connection(conn):
     await conn.set_type_codec(
-        'jsonb', encoder=json.dumps, decoder=json.loads, schema='pg_catalog'
+        'jsonb', encoder=_json_encode, decoder=orjson.loads, schema='pg_catalog'
     )
     await conn.set_type_codec(
-        'json', encoder=json.dumps, decoder=json.loads, schema='pg_catalog'
+        'json', encoder=_json_encode, decoder=orjson.loads, schema='pg_catalog'
     )
 
 
@@ -21,7 +31,8 @@ async def init_pool():
     print(f"Connecting to database...")
     try:
         _pool = await asyncpg.create_pool(
-            DATABASE_URL, min_size=0, max_size=10,
+            DATABASE_URL, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+            statement_cache_size=DB_STATEMENT_CACHE_SIZE,
             init=_init_connection, timeout=10,
         )
         print("Database pool ready")
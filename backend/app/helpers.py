@@ -1,11 +1,18 @@
 import json
 import re
-from typing import Dict, Any, List
+from collections import Counter
+from enum import Enum
+from itertools import islice
+from typing import Dict, Any, AsyncIterator
 from decimal import Decimal
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from html.parser import HTMLParser
 
+import numpy as np
+import orjson
 import pandas as pd
+import pyarrow as pa
+from fastapi.responses import ORJSONResponse
 
 
 def ensure_dict(val):
@@ -22,30 +29,145 @@ def ensure_dict(val):
     return val if isinstance(val, dict) else {}
 
 
+_JSON_NATIVE_TYPES = frozenset({str, int, bool})
+
+
 def convert_to_json_serializable(obj):
     """Convert non-JSON-serializable types to JSON-compatible formats."""
+    # Exact-type fast paths for the common cells; pd.isna is costly per scalar
+    if obj is None:
+        return None
+    t = type(obj)
+    if t in _JSON_NATIVE_TYPES:
+        return obj
+    if t is float:
+        return None if obj != obj else obj
     if isinstance(obj, Decimal):
         return float(obj)
     elif isinstance(obj, (datetime, date)):
         return obj.isoformat()
     elif isinstance(obj, bytes):
         return obj.decode('utf-8', errors='ignore')
+    elif isinstance(obj, np.ndarray):
+        # BigQuery REPEATED cells arrive as arrays; pd.isna on them is elementwise
+        return [convert_to_json_serializable(v) for v in obj.tolist()]
+    elif isinstance(obj, (list, tuple)):
+        return [convert_to_json_serializable(v) for v in obj]
+    elif isinstance(obj, dict):
+        # STRUCT cells, which may nest REPEATED fields
+        return {k: convert_to_json_serializable(v) for k, v in obj.items()}
     elif pd.isna(obj):
         return None
     return obj
 
-def clean_dataframe_for_json(df: pd.DataFrame) -> List[Dict[str, Any]]:
-    """Convert DataFrame to JSON-serializable list of dicts."""
-    df = df.replace({pd.NaT: None, float('nan'): None})
 
-    records = df.to_dict('records')
+def _orjson_default(obj):
+    """orjson fallback for the types it has no native encoding for."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8', errors='ignore')
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, np.ndarray):
+        # Object-dtype arrays (e.g. BigQuery REPEATED/STRUCT cells) that orjson won't take natively
+        return obj.tolist()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Enum):
+        return obj.value
+    return str(obj)
+
+
+class FastJSONResponse(ORJSONResponse):
+    """ORJSONResponse that also encodes numpy scalars/arrays and Decimal without a Python pre-pass."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_orjson_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
 
-    cleaned_records = []
-    for record in records:
-        cleaned_record = {k: convert_to_json_serializable(v) for k, v in record.items()}
-        cleaned_records.append(cleaned_record)
 
-    return cleaned_records
+_STREAM_BATCH_ROWS = 500
+
+
+def _encode_records(names: list, rows) -> bytes:
+    """Comma-joined JSON objects for a batch of row tuples."""
+    return b','.join(
+        orjson.dumps(
+            dict(zip(names, row)), default=_orjson_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
+        for row in rows
+    )
+
+
+def stream_json_records(df: pd.DataFrame, head: bytes = b'', tail: bytes = b'') -> AsyncIterator[bytes]:
+    """
+    Iterator over ``head + [rows...] + tail`` as JSON, ``_STREAM_BATCH_ROWS`` records per chunk.
+
+    The first batch is encoded before this returns, so a frame that cannot be
+    encoded raises while the caller can still send an error status.
+    """
+    names = list(df.columns)
+    rows = df.itertuples(index=False, name=None)
+    first = _encode_records(names, islice(rows, _STREAM_BATCH_ROWS))
+    return _stream_records(names, rows, head + b'[' + first, tail)
+
+
+async def _stream_records(names: list, rows, first: bytes, tail: bytes) -> AsyncIterator[bytes]:
+    yield first
+    # Later batches only exist if the first one was full, so each needs a leading comma
+    while batch := _encode_records(names, islice(rows, _STREAM_BATCH_ROWS)):
+        yield b',' + batch
+    yield b']' + tail
+
+
+def dataframe_to_arrow_ipc(df: pd.DataFrame) -> bytes:
+    """Encode a DataFrame as an Arrow IPC stream (columnar binary, no per-cell Python work)."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _clean_column(col: pd.Series) -> list:
+    """JSON-ready values for one column, dispatching on its dtype once rather than per cell."""
+    kind = col.dtype.kind
+    if kind in "biu" and not col.hasnans:
+        return col.tolist()
+    if kind == "f" and isinstance(col.dtype, np.dtype):
+        return col.astype(object).where(col.notna(), None).tolist()
+    if kind == "M":
+        return [None if v is pd.NaT else v.isoformat() for v in col.tolist()]
+    return [convert_to_json_serializable(v) for v in col.tolist()]
+
+
+def clean_dataframe_for_json(df: pd.DataFrame, orient: str = "records"):
+    """
+    Convert DataFrame to JSON-serializable data: a list of dicts, or with
+    orient="columns" a dict of column name -> list of values.
+    """
+    names = list(df.columns)
+    columns = [_clean_column(col) for _, col in df.items()]
+    if orient == "columns":
+        return dict(zip(names, columns))
+    if df.shape[1] == 0:
+        return [{} for _ in range(len(df))]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+_CODE_FENCE_RE = re.compile(r'```(?:html)?\s*\n(.*?)```', re.DOTALL)
+# Case-insensitive tag searches, so long responses are never lowercased wholesale
+_HTML_OPEN_RE = re.compile(r'<html', re.IGNORECASE)
+_HTML_CLOSE_RE = re.compile(r'</html>', re.IGNORECASE)
 
 
 def strip_markdown_code_block(raw: str) -> str:
@@ -58,31 +180,33 @@ def strip_markdown_code_block(raw: str) -> str:
 
     trimmed = raw.strip()
 
+    # Fast path: a bare document with nothing after </html> (the usual model output)
+    if trimmed.startswith('<!DOCTYPE') and '```' not in trimmed:
+        m = _HTML_CLOSE_RE.search(trimmed)
+        if m is None or m.end() == len(trimmed):
+            return trimmed
+
     # Strategy 1: Look for ```html or ``` code fences
     code_blocks = []
 
     # Find all code blocks (```html...``` or ```...```)
-    pattern = r'```(?:html)?\s*\n(.*?)```'
-    matches = re.findall(pattern, trimmed, re.DOTALL)
-
-    for match in matches:
-        code_blocks.append(match.strip())
+    if '```' in trimmed:
+        code_blocks = [match.strip() for match in _CODE_FENCE_RE.findall(trimmed)]
 
     # Strategy 2: If no code blocks found, look for HTML directly (<!DOCTYPE or <html)
     if not code_blocks:
-        html_start = -1
-        if '<!DOCTYPE' in trimmed:
-            html_start = trimmed.find('<!DOCTYPE')
-        elif '<html' in trimmed.lower():
-            html_start = trimmed.lower().find('<html')
+        html_start = trimmed.find('<!DOCTYPE')
+        if html_start == -1:
+            m = _HTML_OPEN_RE.search(trimmed)
+            if m:
+                html_start = m.start()
 
         if html_start != -1:
-            html_content = trimmed[html_start:]
-            html_end = html_content.lower().find('</html>')
-            if html_end != -1:
-                code_blocks.append(html_content[:html_end + 7].strip())
+            m = _HTML_CLOSE_RE.search(trimmed, html_start)
+            if m:
+                code_blocks.append(trimmed[html_start:m.end()].strip())
             else:
-                code_blocks.append(html_content.strip())
+                code_blocks.append(trimmed[html_start:].strip())
 
     # Strategy 3: Return the largest code block (most likely to be the actual code)
     if code_blocks:
@@ -96,13 +220,19 @@ def strip_markdown_code_block(raw: str) -> str:
         elif code_blocks:
             return max(code_blocks, key=len)
 
-    # Strategy 4: Fallback - if it looks like HTML, return as-is
-    if '<!DOCTYPE' in trimmed or '<html' in trimmed.lower():
-        return trimmed
-
+    # Strategy 4: Fallback - return the text as-is
     return trimmed
 
 
+# Every marker validate_html looks for, matched in a single scan of the document.
+# The widget class check stays case-sensitive, everything else is not.
+_HTML_MARKER_RE = re.compile(
+    r"""(?-i:class=["']widget["'])|<script|<style|x-data|x-init|new chart|chart\(|"""
+    r"""interact\(|alpinejs|chart\.js|chartjs|interactjs|interact\.js""",
+    re.IGNORECASE,
+)
+
+
 class SimpleHTMLValidator(HTMLParser):
     """Simple HTML validator using Python's built-in HTMLParser."""
     def __init__(self):
@@ -158,32 +288,32 @@ def validate_html(html_code: str) -> Dict[str, Any]:
         if not parser.has_body:
             parser.warnings.append("Missing <body> tag")
 
-        html_lower = html_code.lower()
+        hits = Counter(m.group().lower() for m in _HTML_MARKER_RE.finditer(html_code))
 
-        if 'x-data' in html_lower or 'x-init' in html_lower:
-            if 'alpinejs' not in html_lower:
+        if hits['x-data'] or hits['x-init']:
+            if not hits['alpinejs']:
                 parser.warnings.append("Alpine.js directives found but CDN not included")
             else:
                 parser.info.append("✓ Alpine.js CDN included")
 
-        if 'new chart' in html_lower or 'chart(' in html_lower:
-            if 'chart.js' not in html_lower and 'chartjs' not in html_lower:
+        if hits['new chart'] or hits['chart(']:
+            if not hits['chart.js'] and not hits['chartjs']:
                 parser.warnings.append("Chart.js code found but CDN not included")
             else:
                 parser.info.append("✓ Chart.js CDN included")
 
-        if 'interact(' in html_lower:
-            if 'interactjs' not in html_lower and 'interact.js' not in html_lower:
+        if hits['interact(']:
+            if not hits['interactjs'] and not hits['interact.js']:
                 parser.warnings.append("Interact.js code found but CDN not included")
             else:
                 parser.info.append("✓ Interact.js CDN included")
 
-        widget_count = html_code.count('class="widget"') + html_code.count("class='widget'")
+        widget_count = hits['class="widget"'] + hits["class='widget'"]
         if widget_count > 0:
             parser.info.append(f"Found {widget_count} widget(s)")
 
-        script_count = html_code.lower().count('<script')
-        style_count = html_code.lower().count('<style')
+        script_count = hits['<script']
+        style_count = hits['<style']
         if script_count > 0:
             parser.info.append(f"Found {script_count} script tag(s)")
         if style_count > 0:
@@ -0,0 +1,25 @@
+import httpx
+
+_client: httpx.AsyncClient | None = None
+
+
+async def init_client():
+    global _client
+    _client = httpx.AsyncClient(
+        http2=True,
+        timeout=120,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+    )
+
+
+async def close_client():
+    global _client
+    if _client:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    if _client is None:
+        raise RuntimeError("HTTP client not initialised — call init_client() first")
+    return _client
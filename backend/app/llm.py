@@ -7,12 +7,14 @@ formats and extracting token usage from each provider's response.
 """
 
 import asyncio
-import json
+import functools
 import os
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncGenerator, Dict, List, Optional, Union
 
-import requests
+import orjson
+
+from .http_client import get_client
 
 # ---------------------------------------------------------------------------
 # API keys (read once at import time; missing keys just disable that provider)
@@ -91,18 +93,18 @@ def _make_display_name(model_id: str, provider: str) -> str:
     return name.strip()
 
 
-def _fetch_gemini_models() -> List[Dict[str, Any]]:
+async def _fetch_gemini_models() -> List[Dict[str, Any]]:
     if not GEMINI_API_KEY:
         return []
     try:
-        resp = requests.get(
+        resp = await get_client().get(
             "https://generativelanguage.googleapis.com/v1beta/models",
             params={"key": GEMINI_API_KEY, "pageSize": 200},
             timeout=10,
         )
-        if not resp.ok:
+        if not resp.is_success:
             return []
-        data = resp.json()
+        data = orjson.loads(resp.content)
         models = []
         seen = set()
         for m in data.get("models", []):
@@ -130,19 +132,19 @@ def _fetch_gemini_models() -> List[Dict[str, Any]]:
         return []
 
 
-def _fetch_anthropic_models() -> List[Dict[str, Any]]:
+async def _fetch_anthropic_models() -> List[Dict[str, Any]]:
     if not ANTHROPIC_API_KEY:
         return []
     try:
-        resp = requests.get(
+        resp = await get_client().get(
             "https://api.anthropic.com/v1/models",
             headers={"x-api-key": ANTHROPIC_API_KEY, "anthropic-version": "2023-06-01"},
             params={"limit": 100},
             timeout=10,
         )
-        if not resp.ok:
+        if not resp.is_success:
             return []
-        data = resp.json()
+        data = orjson.loads(resp.content)
         models = []
         seen = set()
         for m in data.get("data", []):
@@ -163,18 +165,18 @@ def _fetch_anthropic_models() -> List[Dict[str, Any]]:
         return []
 
 
-def _fetch_openai_models() -> List[Dict[str, Any]]:
+async def _fetch_openai_models() -> List[Dict[str, Any]]:
     if not OPENAI_API_KEY:
         return []
     try:
-        resp = requests.get(
+        resp = await get_client().get(
             "https://api.openai.com/v1/models",
             headers={"Authorization": f"Bearer {OPENAI_API_KEY}"},
             timeout=10,
         )
-        if not resp.ok:
+        if not resp.is_success:
             return []
-        data = resp.json()
+        data = orjson.loads(resp.content)
         models = []
         seen = set()
         for m in data.get("data", []):
@@ -197,18 +199,18 @@ def _fetch_openai_models() -> List[Dict[str, Any]]:
         return []
 
 
-def _fetch_deepseek_models() -> List[Dict[str, Any]]:
+async def _fetch_deepseek_models() -> List[Dict[str, Any]]:
     if not DEEPSEEK_API_KEY:
         return []
     try:
-        resp = requests.get(
+        resp = await get_client().get(
             "https://api.deepseek.com/models",
             headers={"Authorization": f"Bearer {DEEPSEEK_API_KEY}"},
             timeout=10,
         )
-        if not resp.ok:
+        if not resp.is_success:
             return []
-        data = resp.json()
+        data = orjson.loads(resp.content)
         models = []
         for m in data.get("data", []):
             model_id = m.get("id", "")
@@ -225,17 +227,20 @@ def _fetch_deepseek_models() -> List[Dict[str, Any]]:
         return []
 
 
-def get_available_models() -> List[Dict[str, Any]]:
+async def get_available_models() -> List[Dict[str, Any]]:
     """Fetch models from all configured providers (cached for 1 hour)."""
     now = _time.time()
     if _model_cache["models"] and (now - _model_cache["fetched_at"]) < _CACHE_TTL:
         return _model_cache["models"]
 
     all_models = []
-    all_models.extend(_fetch_gemini_models())
-    all_models.extend(_fetch_anthropic_models())
-    all_models.extend(_fetch_openai_models())
-    all_models.extend(_fetch_deepseek_models())
+    for provider_models in await asyncio.gather(
+        _fetch_gemini_models(),
+        _fetch_anthropic_models(),
+        _fetch_openai_models(),
+        _fetch_deepseek_models(),
+    ):
+        all_models.extend(provider_models)
 
     if all_models:
         _model_cache["models"] = all_models
@@ -257,9 +262,9 @@ def _infer_provider(model: str) -> Optional[str]:
     return None
 
 
-def get_model_info(model: str) -> Dict[str, Any]:
+async def get_model_info(model: str) -> Dict[str, Any]:
     """Look up model info from cached models or infer it."""
-    for m in get_available_models():
+    for m in await get_available_models():
         if m["id"] == model:
             return m
     provider = _infer_provider(model)
@@ -408,7 +413,7 @@ def _messages_to_openai(messages: List[dict], system_instruction: str = "") -> L
                     "type": "function",
                     "function": {
                         "name": tc["name"],
-                        "arguments": json.dumps(tc.get("args", {})),
+                        "arguments": orjson.dumps(tc.get("args", {})).decode(),
                     },
                 })
             oai.append({"role": "assistant", "content": msg.get("content") or None, "tool_calls": oai_tool_calls})
@@ -457,7 +462,7 @@ def _safe_json_loads(s):
     if isinstance(s, dict):
         return s
     try:
-        return json.loads(s)
+        return orjson.loads(s)
     except Exception:
         return {"raw": s}
 
@@ -466,6 +471,143 @@ def _safe_json_loads(s):
 # Provider call implementations
 # ---------------------------------------------------------------------------
 
+@functools.lru_cache(maxsize=32)
+def _gemini_system_instruction(text: str) -> bytes:
+    """Encoded Gemini systemInstruction block, built once per distinct prompt."""
+    return orjson.dumps({"parts": [{"text": text}]})
+
+
+# id(tools) -> (tools, encoded bytes); tool lists are module constants, the
+# stored reference keeps the id from being reused while the entry lives.
+_GEMINI_TOOLS_JSON: Dict[int, tuple] = {}
+
+
+def _gemini_tools_json(tools: List[dict]) -> bytes:
+    entry = _GEMINI_TOOLS_JSON.get(id(tools))
+    if entry is None or entry[0] is not tools:
+        if len(_GEMINI_TOOLS_JSON) >= 32:
+            _GEMINI_TOOLS_JSON.clear()
+        entry = (tools, orjson.dumps(tools))
+        _GEMINI_TOOLS_JSON[id(tools)] = entry
+    return entry[1]
+
+
+@functools.lru_cache(maxsize=32)
+def _gemini_generation_config(temperature: float, max_tokens: Optional[int]) -> bytes:
+    """Encoded generationConfig; callers only ever use a handful of temperature/limit pairs."""
+    generation_config: Dict[str, Any] = {"temperature": temperature, "responseMimeType": "text/plain"}
+    if max_tokens:
+        generation_config["maxOutputTokens"] = max_tokens
+    return orjson.dumps(generation_config)
+
+
+# (model, system instruction, encoded tools) -> (cachedContents name or None, expires_at)
+_GEMINI_CONTEXT_CACHE: Dict[tuple, tuple] = {}
+_GEMINI_CONTEXT_MAX = 64
+_GEMINI_CONTEXT_TTL = 3600  # 1 hour
+# Stop referencing a handle a few minutes before Gemini expires it
+_GEMINI_CONTEXT_MARGIN = 300
+# Roughly Gemini's minimum cacheable prefix; smaller prompts are rejected by the API
+_GEMINI_CONTEXT_MIN_CHARS = 16000
+# key -> pending creation, so concurrent first calls share one cachedContents POST
+_GEMINI_CONTEXT_PENDING: Dict[tuple, asyncio.Future] = {}
+
+
+async def _create_gemini_context(model: str, system_instruction: str, tools_json: bytes) -> Optional[str]:
+    body = [b'{"model":', orjson.dumps(f"models/{model}"), b',"ttl":"%ds"' % _GEMINI_CONTEXT_TTL]
+    if system_instruction:
+        body += [b',"systemInstruction":', _gemini_system_instruction(system_instruction)]
+    if tools_json:
+        body += [b',"tools":', tools_json]
+    body.append(b"}")
+    try:
+        resp = await get_client().post(
+            "https://generativelanguage.googleapis.com/v1beta/cachedContents",
+            headers={"Content-Type": "application/json", "x-goog-api-key": GEMINI_API_KEY},
+            content=b"".join(body),
+        )
+        if resp.is_success:
+            return orjson.loads(resp.content).get("name")
+    except Exception:
+        pass
+    return None
+
+
+async def _gemini_cached_context(model: str, system_instruction: str, tools: Optional[List[dict]]) -> Optional[str]:
+    """
+    Return a cachedContents handle holding the static system instruction and
+    tool declarations, so per-call requests only carry the conversation.
+
+    Prefixes that are too small to cache, or that Gemini refuses to cache for
+    this model, are remembered as None and sent inline as before.
+    """
+    tools_json = _gemini_tools_json(tools) if tools else b""
+    if len(system_instruction) + len(tools_json) < _GEMINI_CONTEXT_MIN_CHARS:
+        return None
+
+    key = (model, system_instruction, tools_json)
+    entry = _GEMINI_CONTEXT_CACHE.get(key)
+    if entry and entry[1] > _time.time():
+        return entry[0]
+
+    pending = _GEMINI_CONTEXT_PENDING.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    pending = asyncio.get_running_loop().create_future()
+    _GEMINI_CONTEXT_PENDING[key] = pending
+    name = None
+    try:
+        name = await _create_gemini_context(model, system_instruction, tools_json)
+        # Oldest-first eviction keeps the table bounded as board contexts come and go
+        _GEMINI_CONTEXT_CACHE.pop(key, None)
+        while len(_GEMINI_CONTEXT_CACHE) >= _GEMINI_CONTEXT_MAX:
+            del _GEMINI_CONTEXT_CACHE[next(iter(_GEMINI_CONTEXT_CACHE))]
+        _GEMINI_CONTEXT_CACHE[key] = (name, _time.time() + _GEMINI_CONTEXT_TTL - _GEMINI_CONTEXT_MARGIN)
+    finally:
+        # Waiters fall back to the inline prefix if this request was cancelled
+        del _GEMINI_CONTEXT_PENDING[key]
+        pending.set_result(name)
+    return name
+
+
+def _forget_gemini_context(name: str) -> None:
+    """Stop using a cachedContents handle that Gemini no longer accepts."""
+    for key, entry in list(_GEMINI_CONTEXT_CACHE.items()):
+        if entry[0] == name:
+            _GEMINI_CONTEXT_CACHE[key] = (None, entry[1])
+
+
+def _gemini_body(
+    messages: List[dict],
+    system_instruction: str,
+    tools: Optional[List[dict]],
+    temperature: float,
+    max_tokens: Optional[int],
+    cached_content: Optional[str] = None,
+) -> bytes:
+    """
+    Encoded generateContent request body.
+
+    Only the conversation and generation config are serialized per call; the
+    system instruction and tool declarations are spliced in from cached bytes,
+    or referenced through ``cached_content`` when Gemini already holds them.
+    """
+    body = [
+        b'{"contents":', orjson.dumps(_messages_to_gemini(messages)),
+        b',"generationConfig":', _gemini_generation_config(temperature, max_tokens),
+    ]
+    if cached_content:
+        body += [b',"cachedContent":', orjson.dumps(cached_content)]
+    else:
+        if system_instruction:
+            body += [b',"systemInstruction":', _gemini_system_instruction(system_instruction)]
+        if tools:
+            body += [b',"tools":', _gemini_tools_json(tools)]
+    body.append(b"}")
+    return b"".join(body)
+
+
 async def _call_gemini(
     model: str,
     messages: List[dict],
@@ -479,31 +621,21 @@ async def _call_gemini(
         raise ValueError("GEMINI_API_KEY not configured")
 
     url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
-    contents = _messages_to_gemini(messages)
-
-    payload: Dict[str, Any] = {
-        "contents": contents,
-        "generationConfig": {"temperature": temperature, "responseMimeType": "text/plain"},
-    }
-    if system_instruction:
-        payload["systemInstruction"] = {"parts": [{"text": system_instruction}]}
-    if tools:
-        payload["tools"] = tools
-    if max_tokens:
-        payload["generationConfig"]["maxOutputTokens"] = max_tokens
-
-    resp = await asyncio.to_thread(
-        requests.post,
-        url,
-        headers={"Content-Type": "application/json", "x-goog-api-key": api_key},
-        json=payload,
-        timeout=120,
-    )
-
-    if not resp.ok:
+    headers = {"Content-Type": "application/json", "x-goog-api-key": api_key}
+    cached_content = await _gemini_cached_context(model, system_instruction, tools)
+    body = _gemini_body(messages, system_instruction, tools, temperature, max_tokens, cached_content)
+
+    resp = await get_client().post(url, headers=headers, content=body)
+    if cached_content and resp.status_code in (403, 404):
+        # Handle expired or evicted on Gemini's side; resend the prefix inline
+        _forget_gemini_context(cached_content)
+        body = _gemini_body(messages, system_instruction, tools, temperature, max_tokens)
+        resp = await get_client().post(url, headers=headers, content=body)
+
+    if not resp.is_success:
         raise RuntimeError(f"Gemini API error ({resp.status_code}): {resp.text[:500]}")
 
-    data = resp.json()
+    data = orjson.loads(resp.content)
     candidate = data.get("candidates", [{}])[0]
     finish = candidate.get("finishReason", "")
     parts = candidate.get("content", {}).get("parts", [])
@@ -534,6 +666,73 @@ async def _call_gemini(
     )
 
 
+async def _stream_gemini(
+    model: str,
+    messages: List[dict],
+    system_instruction: str,
+    tools: Optional[List[dict]],
+    temperature: float,
+    max_tokens: Optional[int],
+) -> AsyncGenerator[Union[str, LLMResponse], None]:
+    """Call streamGenerateContent (SSE), yielding text as it arrives and then the LLMResponse."""
+    api_key = GEMINI_API_KEY
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not configured")
+
+    url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:streamGenerateContent"
+    cached_content = await _gemini_cached_context(model, system_instruction, tools)
+
+    func_calls = []
+    text_parts = []
+    finish = ""
+    usage_meta: Dict[str, Any] = {}
+
+    while True:
+        body = _gemini_body(messages, system_instruction, tools, temperature, max_tokens, cached_content)
+        async with get_client().stream(
+            "POST", url,
+            params={"alt": "sse"},
+            headers={"Content-Type": "application/json", "x-goog-api-key": api_key},
+            content=body,
+        ) as resp:
+            if not resp.is_success:
+                error = (await resp.aread()).decode("utf-8", errors="replace")
+            else:
+                error = None
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = orjson.loads(line[5:])
+                    candidate = (data.get("candidates") or [{}])[0]
+                    finish = candidate.get("finishReason") or finish
+                    usage_meta = data.get("usageMetadata") or usage_meta
+                    for p in candidate.get("content", {}).get("parts", []):
+                        if "functionCall" in p:
+                            fc = p["functionCall"]
+                            func_calls.append(FunctionCall(name=fc["name"], args=fc.get("args", {})))
+                        if p.get("text"):
+                            text_parts.append(p["text"])
+                            yield p["text"]
+        if error is None:
+            break
+        if cached_content and resp.status_code in (403, 404):
+            # Handle expired or evicted on Gemini's side; resend the prefix inline
+            _forget_gemini_context(cached_content)
+            cached_content = None
+            continue
+        raise RuntimeError(f"Gemini API error ({resp.status_code}): {error[:500]}")
+
+    yield LLMResponse(
+        text="".join(text_parts) if text_parts else None,
+        function_calls=func_calls if func_calls else None,
+        finish_reason=finish,
+        input_tokens=usage_meta.get("promptTokenCount", 0),
+        output_tokens=usage_meta.get("candidatesTokenCount", 0),
+        model=model,
+        provider="gemini",
+    )
+
+
 async def _call_anthropic(
     model: str,
     messages: List[dict],
@@ -567,14 +766,12 @@ async def _call_anthropic(
         "anthropic-version": "2023-06-01",
     }
 
-    resp = await asyncio.to_thread(
-        requests.post, url, headers=headers, json=body, timeout=120,
-    )
+    resp = await get_client().post(url, headers=headers, content=orjson.dumps(body))
 
-    if not resp.ok:
+    if not resp.is_success:
         raise RuntimeError(f"Anthropic API error ({resp.status_code}): {resp.text[:500]}")
 
-    data = resp.json()
+    data = orjson.loads(resp.content)
     usage = data.get("usage", {})
     stop = data.get("stop_reason", "")
 
@@ -646,14 +843,12 @@ async def _call_openai_compat(
         "Authorization": f"Bearer {api_key}",
     }
 
-    resp = await asyncio.to_thread(
-        requests.post, base_url, headers=headers, json=body, timeout=120,
-    )
+    resp = await get_client().post(base_url, headers=headers, content=orjson.dumps(body))
 
-    if not resp.ok:
+    if not resp.is_success:
         raise RuntimeError(f"{provider} API error ({resp.status_code}): {resp.text[:500]}")
 
-    data = resp.json()
+    data = orjson.loads(resp.content)
     choice = data.get("choices", [{}])[0]
     msg = choice.get("message", {})
     usage = data.get("usage", {})
@@ -665,8 +860,8 @@ async def _call_openai_compat(
         fn = tc.get("function", {})
         args = fn.get("arguments", "{}")
         try:
-            parsed_args = json.loads(args)
-        except json.JSONDecodeError:
+            parsed_args = orjson.loads(args)
+        except orjson.JSONDecodeError:
             parsed_args = {"raw": args}
         func_calls.append(FunctionCall(name=fn.get("name", ""), args=parsed_args))
 
@@ -715,7 +910,7 @@ async def call_llm(
     -------
     LLMResponse with text, function_calls, token counts, etc.
     """
-    info = get_model_info(model)
+    info = await get_model_info(model)
     provider = info["provider"]
 
     # Strip tools if model doesn't support them
@@ -730,3 +925,36 @@ async def call_llm(
         return await _call_openai_compat(model, messages, system_instruction, tools, temperature, max_tokens, provider)
     else:
         raise ValueError(f"Unknown provider: {provider}")
+
+
+async def stream_llm(
+    model: str,
+    messages: List[dict],
+    system_instruction: str = "",
+    tools: Optional[List[dict]] = None,
+    temperature: float = 0.3,
+    max_tokens: Optional[int] = None,
+) -> AsyncGenerator[Union[str, LLMResponse], None]:
+    """
+    Streaming variant of call_llm().
+
+    Yields text chunks (str) as the model produces them, followed by exactly
+    one LLMResponse carrying the full text, function calls and token usage.
+    Providers without a streaming implementation yield their whole text as a
+    single chunk.
+    """
+    info = await get_model_info(model)
+    provider = info["provider"]
+
+    if not info.get("supports_tools", True):
+        tools = None
+
+    if provider == "gemini":
+        async for chunk in _stream_gemini(model, messages, system_instruction, tools, temperature, max_tokens):
+            yield chunk
+        return
+
+    resp = await call_llm(model, messages, system_instruction, tools, temperature, max_tokens)
+    if resp.text:
+        yield resp.text
+    yield resp
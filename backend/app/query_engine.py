@@ -1,19 +1,39 @@
 import os
 import json
-import tempfile
-from typing import Dict, Any, Optional, List
-
+import logging
+import time
+import asyncio
+import hashlib
+import functools
+import itertools
+import re
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from typing import Dict, Any, Optional, List, Callable, Awaitable, Mapping, Tuple
+
+import asyncpg
+import orjson
 import pandas as pd
 import sqlalchemy as sa
 from sqlalchemy import inspect as sa_inspect
-from jinja2 import Template
+from jinja2 import Environment, Template, TemplateSyntaxError, meta
 from fastapi import HTTPException
-from google.cloud import bigquery
+import google.auth
+from google.api_core.exceptions import PermissionDenied
+from google.auth.credentials import with_scopes_if_required
+from google.auth.transport.requests import AuthorizedSession
+from google.cloud import bigquery, bigquery_storage
+from google.cloud.bigquery import DEFAULT_RETRY
 from google.oauth2 import service_account
+from requests.adapters import HTTPAdapter
 
 from .db import get_pool
 from .storage import get_storage_provider
-from .helpers import clean_dataframe_for_json, ensure_dict
+from .helpers import clean_dataframe_for_json, convert_to_json_serializable, ensure_dict
+
+logger = logging.getLogger(__name__)
 
 storage = get_storage_provider()
 
@@ -21,30 +41,119 @@ CONNSTRING_TYPES = ("postgres", "mysql", "mssql")
 SA_TYPES = ("postgres", "mysql", "mssql", "athena", "duckdb")
 
 
+# ---------------------------------------------------------------------------
+# Blocking datastore I/O
+# ---------------------------------------------------------------------------
+
+# Driver calls (BigQuery, SQLAlchemy) block for the whole query; they run on a
+# dedicated pool so query nodes overlap without starving FastAPI's threadpool.
+_DATASTORE_IO_WORKERS = int(os.getenv("DATASTORE_IO_WORKERS", "32"))
+_datastore_io = ThreadPoolExecutor(max_workers=_DATASTORE_IO_WORKERS, thread_name_prefix="datastore-io")
+
+
+async def run_blocking(fn: Callable[..., Any], *args: Any) -> Any:
+    """Run a blocking datastore call on the datastore I/O pool."""
+    return await asyncio.get_running_loop().run_in_executor(_datastore_io, functools.partial(fn, *args))
+
+
 # ---------------------------------------------------------------------------
 # BigQuery client
 # ---------------------------------------------------------------------------
 
+# (project_id, keyfile_path) and (project_id, "sha256:<keyfile digest>") -> Client,
+# least recently used first; each client owns a pooled HTTP session. Evicted
+# clients are not closed since cached executors may still hold them; they are
+# released with their last reference.
+_BQ_CLIENTS: "OrderedDict[Tuple[Optional[str], Optional[str]], bigquery.Client]" = OrderedDict()
+_BQ_CLIENTS_MAX = 64
+_bq_client_lock = asyncio.Lock()
+# Client -> the credentials it was built with, for opening Storage Read API clients
+_BQ_CREDENTIALS: "weakref.WeakKeyDictionary[bigquery.Client, Any]" = weakref.WeakKeyDictionary()
+
+
+def _bigquery_session(credentials) -> AuthorizedSession:
+    """Authorized HTTP session with a connection pool sized for concurrent queries."""
+    session = AuthorizedSession(with_scopes_if_required(credentials, bigquery.Client.SCOPE))
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64)
+    session.mount("https://", adapter)
+    return session
+
+
 async def get_bigquery_client(config):
-    """Creates a BigQuery client from config."""
+    """Returns a shared BigQuery client for the config's project and keyfile."""
     config = ensure_dict(config)
     project_id = config.get("project_id")
     keyfile_path_in_storage = config.get("keyfile_path")
 
-    if keyfile_path_in_storage:
-        try:
-            res = await storage.download("secret-files", keyfile_path_in_storage)
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as tmp:
-                tmp.write(res)
-                tmp_path = tmp.name
+    key = (project_id, keyfile_path_in_storage)
+    client = _BQ_CLIENTS.get(key)
+    if client is not None:
+        _BQ_CLIENTS.move_to_end(key)
+        return client
 
-            credentials = service_account.Credentials.from_service_account_file(tmp_path)
-            client = bigquery.Client(credentials=credentials, project=project_id)
+    async with _bq_client_lock:
+        # Concurrent misses for the same datastore wait here and build one client
+        client = _BQ_CLIENTS.get(key)
+        if client is not None:
             return client
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to load keyfile: {str(e)}")
 
-    return bigquery.Client(project=project_id)
+        cred_key = None
+        if keyfile_path_in_storage:
+            try:
+                res = await storage.download("secret-files", keyfile_path_in_storage)
+                # Datastores sharing a service account key share one client and connection pool
+                cred_key = (project_id, "sha256:" + hashlib.sha256(res).hexdigest())
+                client = _BQ_CLIENTS.get(cred_key)
+                if client is not None:
+                    _BQ_CLIENTS.move_to_end(cred_key)
+                    _remember_bigquery_client(key, client)
+                    return client
+                credentials = service_account.Credentials.from_service_account_info(orjson.loads(res))
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Failed to load keyfile: {str(e)}")
+        else:
+            credentials, _ = google.auth.default(scopes=bigquery.Client.SCOPE)
+
+        client = bigquery.Client(
+            credentials=credentials, project=project_id, _http=_bigquery_session(credentials)
+        )
+        _BQ_CREDENTIALS[client] = credentials
+        if cred_key is not None:
+            _remember_bigquery_client(cred_key, client)
+        _remember_bigquery_client(key, client)
+        return client
+
+
+def ping_bigquery(client: bigquery.Client) -> None:
+    """Blocking connectivity check: list at most one dataset, giving up after 5s."""
+    list(client.list_datasets(max_results=1, page_size=1, retry=DEFAULT_RETRY.with_deadline(5)))
+
+
+def ping_sql_engine(engine) -> None:
+    """Blocking connectivity check for a SQLAlchemy engine."""
+    with engine.connect() as conn:
+        conn.execute(sa.text("SELECT 1"))
+
+
+_PG_SCHEME_RE = re.compile(r'^postgres(?:ql)?(?:\+\w+)?://')
+
+
+async def ping_postgres(conn_str: str) -> None:
+    """
+    Connectivity check for a Postgres connection string over a one-off asyncpg
+    connection, so testing a config doesn't build (and cache) a pooled engine.
+    """
+    conn = await asyncpg.connect(dsn=_PG_SCHEME_RE.sub("postgresql://", conn_str), timeout=5)
+    try:
+        await conn.fetchval("SELECT 1")
+    finally:
+        await conn.close()
+
+
+def _remember_bigquery_client(key: Tuple[Optional[str], Optional[str]], client: bigquery.Client) -> None:
+    _BQ_CLIENTS[key] = client
+    if len(_BQ_CLIENTS) > _BQ_CLIENTS_MAX:
+        _BQ_CLIENTS.popitem(last=False)
 
 
 # ---------------------------------------------------------------------------
@@ -88,108 +197,282 @@ def get_sa_engine(ds_type: str, config: Dict[str, Any]):
         conn_str = config.get("connection_string")
     if not conn_str:
         raise HTTPException(status_code=400, detail=f"Connection string missing for {ds_type}")
-    return sa.create_engine(conn_str)
+    return _create_engine(conn_str, pooled=ds_type != "duckdb")
+
+
+# Per-engine connection pool; sized so a dashboard's parallel widget queries on
+# one datastore don't queue behind each other on the datastore I/O pool
+_SA_POOL_SIZE = int(os.getenv("SA_POOL_SIZE", "5"))
+_SA_MAX_OVERFLOW = int(os.getenv("SA_MAX_OVERFLOW", "10"))
+
+
+@functools.lru_cache(maxsize=32)
+def _create_engine(conn_str: str, pooled: bool = True):
+    """One engine (and connection pool) per connection string, shared across requests."""
+    if not pooled:
+        # DuckDB uses a single-connection pool that rejects QueuePool sizing options.
+        return sa.create_engine(conn_str)
+    return sa.create_engine(
+        conn_str,
+        pool_size=_SA_POOL_SIZE,
+        max_overflow=_SA_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        pool_timeout=30,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Per-datastore executors
+# ---------------------------------------------------------------------------
+
+Executor = Callable[[str], Awaitable[pd.DataFrame]]
+
+# datastore_id -> (config fingerprint, executor, SA engine or None)
+_EXECUTOR_CACHE: Dict[str, Tuple[str, Executor, Any]] = {}
+
+
+def _config_fingerprint(ds_type: str, config: Dict[str, Any]) -> str:
+    raw = json.dumps([ds_type, config], sort_keys=True, default=str)
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+async def get_executor(datastore: Dict[str, Any]) -> Executor:
+    """
+    Return a coroutine that runs rendered SQL on this datastore.
+
+    The client/engine and result adapter are bound once per datastore and
+    rebuilt only when its type or config changes.
+    """
+    ds_id = str(datastore["id"])
+    ds_type = datastore["type"]
+    ds_config = ensure_dict(datastore["config"])
+    fingerprint = _config_fingerprint(ds_type, ds_config)
+
+    cached = _EXECUTOR_CACHE.get(ds_id)
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+
+    engine = None
+    if ds_type == "bigquery":
+        client = await get_bigquery_client(ds_config)
+        read_client = bigquery_storage.BigQueryReadClient(credentials=_BQ_CREDENTIALS[client])
+
+        def run_sync(rendered_sql: str) -> pd.DataFrame:
+            nonlocal read_client
+            job = client.query(rendered_sql)
+            # Results beyond the first page come over the Storage Read API as Arrow
+            # rather than paginated REST JSON; small results never open a read session
+            if read_client is not None:
+                try:
+                    return job.result().to_dataframe(bqstorage_client=read_client)
+                except PermissionDenied:
+                    # Key lacks bigquery.readsessions.create; stay on REST for this datastore
+                    read_client = None
+            return job.result().to_dataframe(create_bqstorage_client=False)
+
+        async def executor(rendered_sql: str) -> pd.DataFrame:
+            return await run_blocking(run_sync, rendered_sql)
+
+    elif ds_type in SA_TYPES:
+        engine = get_sa_engine(ds_type, ds_config)
+
+        async def executor(rendered_sql: str) -> pd.DataFrame:
+            return await run_blocking(pd.read_sql, rendered_sql, engine)
+
+    else:
+        raise HTTPException(status_code=400, detail=f"Unsupported datastore type: {ds_type}")
+
+    if cached and cached[2] is not None:
+        cached[2].dispose()
+    _EXECUTOR_CACHE[ds_id] = (fingerprint, executor, engine)
+    return executor
 
 
 # ---------------------------------------------------------------------------
 # Python node parsing
 # ---------------------------------------------------------------------------
 
-def parse_python_nodes(python_code: str) -> List[Dict[str, Any]]:
-    """Parse @node comments from Python code. Supports both @datastore and @connector (legacy)."""
-    lines = python_code.split('\n')
+_NODE_DIRECTIVE_RE = re.compile(r'\s*# @(node|type|datastore|connector|query):(.*)')
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_python_nodes(python_code: str) -> Tuple[Mapping[str, Any], ...]:
+    """
+    Parse @node comments from Python code. Supports both @datastore and @connector (legacy).
+
+    Cached by source text; nodes are returned read-only since callers share them.
+    """
     nodes = []
     current_node = None
 
-    for i, line in enumerate(lines):
-        if line.strip().startswith('# @node:'):
+    for i, line in enumerate(python_code.split('\n')):
+        m = _NODE_DIRECTIVE_RE.match(line)
+        if not m:
+            continue
+        key, value = m.group(1), m.group(2).strip()
+        if key == 'node':
             if current_node:
                 nodes.append(current_node)
             current_node = {
-                'name': line.split('# @node:')[1].strip(),
+                'name': value,
                 'type': None,
                 'datastore_id': None,
                 'query': None,
                 'start_line': i
             }
         elif current_node:
-            if line.strip().startswith('# @type:'):
-                current_node['type'] = line.split('# @type:')[1].strip()
-            elif line.strip().startswith('# @datastore:'):
-                current_node['datastore_id'] = line.split('# @datastore:')[1].strip()
-            elif line.strip().startswith('# @connector:'):
+            if key == 'datastore':
+                current_node['datastore_id'] = value
+            elif key == 'connector':
                 if not current_node['datastore_id']:
-                    current_node['datastore_id'] = line.split('# @connector:')[1].strip()
-            elif line.strip().startswith('# @query:'):
-                query_line = line.split('# @query:')[1].strip()
-                current_node['query'] = query_line
-            elif not line.strip().startswith('#') and current_node.get('query'):
-                pass
+                    current_node['datastore_id'] = value
+            else:
+                current_node[key] = value
 
     if current_node:
         nodes.append(current_node)
 
-    return nodes
+    return tuple(MappingProxyType(node) for node in nodes)
 
 
 # ---------------------------------------------------------------------------
 # Query execution
 # ---------------------------------------------------------------------------
 
+# Shared environment for SQL templates. from_string() does not cache by source,
+# so compiled templates are memoised below.
+_SQL_TEMPLATE_ENV = Environment(autoescape=False, auto_reload=False)
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_sql_template(src: str) -> Template:
+    """Compiled Jinja template for a SQL source string, reused across renders."""
+    return _SQL_TEMPLATE_ENV.from_string(src)
+
+
+def render_sql_template(src: str, context: Mapping[str, Any]) -> str:
+    """Render a SQL template; plain SQL with no Jinja markup is returned untouched."""
+    if "{{" not in src and "{%" not in src and "{#" not in src:
+        return src
+    return compile_sql_template(src).render(context)
+
+
+@functools.lru_cache(maxsize=1024)
+def _sql_template_names(src: str) -> Optional[frozenset]:
+    """Names a SQL template reads from its context; None if it does not parse."""
+    if "{{" not in src and "{%" not in src and "{#" not in src:
+        return frozenset()
+    try:
+        return frozenset(meta.find_undeclared_variables(_SQL_TEMPLATE_ENV.parse(src)))
+    except TemplateSyntaxError:
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Datastore lookups
+# ---------------------------------------------------------------------------
+
+# datastore_id -> (expires_at, row); dashboard loads fan out many nodes on the same datastore
+_DATASTORE_CACHE: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_DATASTORE_TTL = 60
+_DATASTORE_CACHE_MAX = 256
+# (expires_at, id) of the fallback datastore for nodes without a valid @datastore
+_first_datastore: Optional[Tuple[float, str]] = None
+
+
+async def get_datastore(datastore_id: str) -> Optional[Dict[str, Any]]:
+    """Datastore row by id (cached for _DATASTORE_TTL seconds), or None if it does not exist."""
+    datastore_id = str(datastore_id)
+    entry = _DATASTORE_CACHE.get(datastore_id)
+    if entry and entry[0] > time.time():
+        return dict(entry[1])
+
+    row = await get_pool().fetchrow("SELECT * FROM datastores WHERE id = $1", datastore_id)
+    if not row:
+        return None
+    if len(_DATASTORE_CACHE) >= _DATASTORE_CACHE_MAX:
+        _DATASTORE_CACHE.clear()
+    _DATASTORE_CACHE[datastore_id] = (time.time() + _DATASTORE_TTL, dict(row))
+    return dict(row)
+
+
+async def prefetch_datastores(datastore_ids) -> None:
+    """Load every uncached datastore among ``datastore_ids`` with a single query."""
+    now = time.time()
+    missing = {
+        str(ds_id) for ds_id in datastore_ids
+        if ds_id and not (str(ds_id) in _DATASTORE_CACHE and _DATASTORE_CACHE[str(ds_id)][0] > now)
+    }
+    if not missing:
+        return
+    rows = await get_pool().fetch("SELECT * FROM datastores WHERE id = ANY($1::uuid[])", list(missing))
+    if len(_DATASTORE_CACHE) + len(rows) > _DATASTORE_CACHE_MAX:
+        _DATASTORE_CACHE.clear()
+    for row in rows:
+        _DATASTORE_CACHE[str(row["id"])] = (now + _DATASTORE_TTL, dict(row))
+
+
+async def _first_datastore_id() -> Optional[str]:
+    """Id of the first available datastore (the auto-select fallback); an empty result is not cached."""
+    global _first_datastore
+    if _first_datastore and _first_datastore[0] > time.time():
+        return _first_datastore[1]
+    ds_row = await get_pool().fetchrow("SELECT id FROM datastores LIMIT 1")
+    if not ds_row:
+        return None
+    _first_datastore = (time.time() + _DATASTORE_TTL, str(ds_row["id"]))
+    return _first_datastore[1]
+
+
+def invalidate_datastore_cache(datastore_id: str) -> None:
+    """Forget everything cached about a datastore after it is edited or deleted."""
+    global _first_datastore
+    _DATASTORE_CACHE.pop(str(datastore_id), None)
+    _first_datastore = None
+    invalidate_schema_cache(datastore_id)
+
+
 async def run_query_logic(datastore_id: str, query_template: str, context: Dict[str, Any]):
     """Internal helper to execute a templated query on a specific datastore."""
     try:
-        pool = get_pool()
-        row = await pool.fetchrow("SELECT * FROM datastores WHERE id = $1", datastore_id)
-        if not row:
+        datastore = await get_datastore(datastore_id)
+        if not datastore:
             raise HTTPException(status_code=404, detail="Datastore not found")
-        datastore = dict(row)
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=f"Datastore fetch error: {str(e)}")
 
     try:
-        template = Template(query_template)
-        rendered_sql = template.render(**context)
+        rendered_sql = render_sql_template(query_template, context)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Template error: {str(e)}")
 
     try:
-        ds_type = datastore["type"]
-        ds_config = ensure_dict(datastore["config"])
-
-        if ds_type == "bigquery":
-            client = await get_bigquery_client(ds_config)
-            query_job = client.query(rendered_sql)
-            results = query_job.result()
-            return [dict(row.items()) for row in results]
-
-        elif ds_type in SA_TYPES:
-            engine = get_sa_engine(ds_type, ds_config)
-            df = pd.read_sql(rendered_sql, engine)
-            return df.to_dict(orient="records")
-
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported datastore type: {ds_type}")
+        executor = await get_executor(datastore)
+        return await executor(rendered_sql)
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        # Usually a bad user query; the message goes back to the caller, so skip the stack
+        logger.warning("Query on datastore %s failed: %s", datastore_id, e)
         error_msg = str(e)
         if "Table" in error_msg or "dataset" in error_msg or "syntax" in error_msg.lower():
             raise HTTPException(status_code=400, detail=f"Query error: {error_msg}")
         raise HTTPException(status_code=500, detail=f"Execution error: {error_msg}")
 
 
+@functools.lru_cache(maxsize=512)
+def _compile_user_code(src_hash: str, src: str):
+    """Compiled code object for a query's Python source, reused across runs."""
+    return compile(src, f"<query:{src_hash}>", "exec")
+
+
+# Canonical (hyphenated) or bare 32-hex UUIDs, the forms Postgres' uuid type accepts
+_UUID_RE = re.compile(r'[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}\Z', re.IGNORECASE)
+
+
 def _is_valid_uuid(val) -> bool:
-    if not val or not isinstance(val, str):
-        return False
-    try:
-        import uuid as _uuid
-        _uuid.UUID(val)
-        return True
-    except (ValueError, AttributeError):
-        return False
+    return isinstance(val, str) and _UUID_RE.match(val) is not None
 
 
 async def execute_python_query(
@@ -197,53 +480,90 @@ async def execute_python_query(
     args: Dict[str, Any] = None,
     datastore_id: Optional[str] = None,
     limit_rows: int = 10,
+    orient: str = "records",
 ) -> Dict[str, Any]:
     """
     Execute a Python query exactly the way the dashboard does:
     parse nodes, resolve datastores (with auto-select fallback),
     run SQL via run_query_logic, exec the Python code, return results.
+    With orient="columns", sample_rows is a dict of column name -> values.
     """
     try:
         args = args or {}
         nodes = parse_python_nodes(python_code)
         full_context = {"args": args, "pd": pd, "json": json, **args}
-        pool = get_pool()
 
-        for node in nodes:
-            if node["type"] != "query" or not node.get("query"):
-                continue
+        src_hash = hashlib.blake2b(python_code.encode(), digest_size=16).hexdigest()
+        try:
+            code = _compile_user_code(src_hash, python_code)
+        except (SyntaxError, ValueError) as py_err:
+            return {"success": False, "error": f"Python execution error: {str(py_err)}"}
 
+        query_nodes = [node for node in nodes if node["type"] == "query" and node.get("query")]
+        request_ds = datastore_id if _is_valid_uuid(datastore_id) else None
+        # One lookup for all the datastores this query touches instead of one per node
+        await prefetch_datastores(
+            {request_ds} | {node["datastore_id"] for node in query_nodes if _is_valid_uuid(node.get("datastore_id"))}
+        )
+
+        targets = []
+        for node in query_nodes:
             node_ds = node["datastore_id"] if _is_valid_uuid(node.get("datastore_id")) else None
-            request_ds = datastore_id if _is_valid_uuid(datastore_id) else None
             active_ds = node_ds or request_ds
 
             if not active_ds:
-                ds_row = await pool.fetchrow("SELECT id FROM datastores LIMIT 1")
-                if ds_row:
-                    active_ds = str(ds_row["id"])
+                active_ds = await _first_datastore_id()
 
             if not active_ds:
                 return {
                     "success": False,
                     "error": f"No datastore available for node '{node['name']}'. Add a @datastore UUID or connect a datastore.",
                 }
-
+            targets.append(active_ds)
+
+        # A node whose SQL reads query_result or an earlier node's result starts a new
+        # batch; nodes within a batch read nothing from each other and run together
+        batches: List[List[int]] = []
+        earlier = {"query_result"}
+        for i, node in enumerate(query_nodes):
+            names = _sql_template_names(node["query"])
+            if not batches or names is None or names & earlier:
+                batches.append([])
+            batches[-1].append(i)
+            earlier.add(node["name"])
+
+        for batch in batches:
+            template_context = dict(full_context)
+            tasks = [
+                asyncio.ensure_future(run_query_logic(targets[i], query_nodes[i]["query"], template_context))
+                for i in batch
+            ]
             try:
-                result_data = await run_query_logic(active_ds, node["query"], full_context)
-                df = pd.DataFrame(result_data)
-                full_context["query_result"] = df
-                full_context[node["name"]] = df
-            except Exception as sql_err:
-                error_detail = str(sql_err)
-                if hasattr(sql_err, "detail"):
-                    error_detail = sql_err.detail
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            finally:
+                # First failure stops the rest of the batch and every later node
+                for task in tasks:
+                    task.cancel()
+            # Cancelled siblings have not necessarily unwound yet; settle every task first
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            for i, res in zip(batch, results):
+                if not isinstance(res, BaseException) or isinstance(res, asyncio.CancelledError):
+                    continue
+                if not isinstance(res, Exception):
+                    raise res
+                error_detail = res.detail if hasattr(res, "detail") else str(res)
                 return {
                     "success": False,
-                    "error": f"SQL error in '{node['name']}': {error_detail}",
+                    "error": f"SQL error in '{query_nodes[i]['name']}': {error_detail}",
                 }
+            for i, df in zip(batch, results):
+                full_context["query_result"] = df
+                full_context[query_nodes[i]["name"]] = df
 
         try:
-            exec(python_code, {}, full_context)
+            # One namespace as globals: names resolve via LOAD_GLOBAL, and functions or
+            # comprehensions in the query can see its top-level variables
+            exec(code, full_context)
         except Exception as py_err:
             return {"success": False, "error": f"Python execution error: {str(py_err)}"}
 
@@ -255,17 +575,19 @@ async def execute_python_query(
             row_count = len(result_df)
             columns = list(result_df.columns)
             if limit_rows > 0:
-                sample_data = clean_dataframe_for_json(result_df.head(limit_rows))
+                sample_data = clean_dataframe_for_json(result_df.head(limit_rows), orient)
             else:
-                sample_data = clean_dataframe_for_json(result_df)
+                sample_data = clean_dataframe_for_json(result_df, orient)
         elif isinstance(result_df, list):
             row_count = len(result_df)
             columns = list(result_df[0].keys()) if result_df else []
             sample_data = result_df[:limit_rows] if limit_rows > 0 else result_df
+            if orient == "columns":
+                sample_data = {c: [r.get(c) for r in sample_data] for c in columns}
         else:
             row_count = 1
             columns = ["result"]
-            sample_data = [{"result": str(result_df)}]
+            sample_data = {"result": [str(result_df)]} if orient == "columns" else [{"result": str(result_df)}]
 
         return {
             "success": True,
@@ -287,16 +609,27 @@ async def test_query(python_code: str, limit_rows: int = 5, test_args: Dict[str,
     """Test execute a query and return first few rows or error. Uses the same path as the dashboard."""
     return await execute_python_query(python_code, args=test_args, limit_rows=limit_rows)
 
+def _bigquery_sample(client: bigquery.Client, sql_query: str, limit: int) -> Tuple[List[str], List[Dict[str, Any]], int]:
+    """(columns, first `limit` rows as JSON-ready records, total row count) for a BigQuery query."""
+    # Row iterator straight to records: no DataFrame, and pages past `limit` are never fetched
+    rows = client.query(sql_query).result()
+    columns = [field.name for field in rows.schema]
+    sample_data = [
+        {name: convert_to_json_serializable(value) for name, value in zip(columns, row.values())}
+        for row in itertools.islice(rows, limit)
+    ]
+    total_rows = rows.total_rows if rows.total_rows is not None else len(sample_data)
+    return columns, sample_data, total_rows
+
+
 async def execute_query_direct(datastore_id: str, sql_query: str, limit: int = 100) -> Dict[str, Any]:
     """Execute a SQL query directly on a datastore and return results."""
     try:
         limit = min(limit, 1000)
 
-        pool = get_pool()
-        ds_row = await pool.fetchrow("SELECT * FROM datastores WHERE id = $1", datastore_id)
-        if not ds_row:
+        datastore = await get_datastore(datastore_id)
+        if not datastore:
             return {"success": False, "error": f"Datastore {datastore_id} not found"}
-        datastore = dict(ds_row)
 
         ds_config = ensure_dict(datastore["config"])
         ds_type = datastore["type"]
@@ -304,11 +637,13 @@ async def execute_query_direct(datastore_id: str, sql_query: str, limit: int = 1
         try:
             if ds_type == "bigquery":
                 client = await get_bigquery_client(ds_config)
-                query_job = client.query(sql_query)
-                df = query_job.to_dataframe()
+                columns, sample_data, total_rows = await run_blocking(_bigquery_sample, client, sql_query, limit)
             elif ds_type in SA_TYPES:
                 engine = get_sa_engine(ds_type, ds_config)
-                df = pd.read_sql(sql_query, engine)
+                df = await run_blocking(pd.read_sql, sql_query, engine)
+                total_rows = len(df)
+                sample_data = clean_dataframe_for_json(df.head(limit))
+                columns = list(df.columns)
             else:
                 return {
                     "success": False,
@@ -326,12 +661,6 @@ async def execute_query_direct(datastore_id: str, sql_query: str, limit: int = 1
                 "sql_query": sql_query,
             }
 
-        total_rows = len(df)
-        limited_df = df.head(limit)
-
-        sample_data = clean_dataframe_for_json(limited_df)
-        columns = list(df.columns)
-
         return {
             "success": True,
             "datastore_name": datastore.get("name", "Unknown"),
@@ -357,14 +686,77 @@ async def execute_query_direct(datastore_id: str, sql_query: str, limit: int = 1
 # Schema introspection
 # ---------------------------------------------------------------------------
 
+_SCHEMA_TTL = 300  # 5 minutes
+# Re-introspect at least this often even if the fingerprint never changes (row estimates, missed DDL)
+_SCHEMA_MAX_AGE = 3600
+_SCHEMA_MAX_TABLES = 500  # per-dataset cap when listing tables
+
+# (datastore_id, config fingerprint, dataset, table) -> (expires_at, schema fingerprint, result, created_at),
+# least recently used first
+_schema_cache: "OrderedDict[tuple, Tuple[float, Optional[str], Any, float]]" = OrderedDict()
+_SCHEMA_CACHE_MAX = 512
+# Only keys being introspected right now have a lock
+_schema_locks: Dict[tuple, asyncio.Lock] = {}
+
+
+def invalidate_schema_cache(datastore_id: str) -> None:
+    """Drop cached introspection results for a datastore (after edits or on refresh)."""
+    datastore_id = str(datastore_id)
+    for key in [k for k in _schema_cache if k[0] == datastore_id]:
+        del _schema_cache[key]
+    for key in [k for k in _schema_locks if k[0] == datastore_id]:
+        del _schema_locks[key]
+
+
+async def _cached_schema(datastore: Dict[str, Any], dataset: Optional[str], table: Optional[str], introspect, fingerprint):
+    """
+    Return a cached introspection result, running ``introspect`` at most once per key and TTL.
+
+    Once the TTL lapses, ``fingerprint`` (a cheap catalog probe, or None when
+    the backend has none) is compared with the stored value; if the schema is
+    unchanged the cached result is kept for another TTL without re-introspecting,
+    up to ``_SCHEMA_MAX_AGE`` after it was introspected.
+    """
+    ds_config = ensure_dict(datastore["config"])
+    key = (str(datastore.get("id", "")), _config_fingerprint(datastore["type"], ds_config), dataset, table)
+    hit = _schema_cache.get(key)
+    if hit and hit[0] > time.time():
+        _schema_cache.move_to_end(key)
+        return hit[2]
+
+    lock = _schema_locks.setdefault(key, asyncio.Lock())
+    try:
+        async with lock:
+            hit = _schema_cache.get(key)
+            if hit and hit[0] > time.time():
+                return hit[2]
+            current = await fingerprint(datastore, dataset, table)
+            if hit and current is not None and current == hit[1] and hit[3] + _SCHEMA_MAX_AGE > time.time():
+                _remember_schema(key, (time.time() + _SCHEMA_TTL, current, hit[2], hit[3]))
+                return hit[2]
+            result = await introspect(datastore, dataset, table)
+            now = time.time()
+            _remember_schema(key, (now + _SCHEMA_TTL, current, result, now))
+            return result
+    finally:
+        # Callers arriving after this see the filled entry (or retry with a fresh lock)
+        if _schema_locks.get(key) is lock:
+            del _schema_locks[key]
+
+
+def _remember_schema(key: tuple, entry: Tuple[float, Optional[str], Any, float]) -> None:
+    _schema_cache[key] = entry
+    _schema_cache.move_to_end(key)
+    if len(_schema_cache) > _SCHEMA_CACHE_MAX:
+        _schema_cache.popitem(last=False)
+
+
 async def get_datastore_schema(datastore_id: str, dataset: Optional[str] = None, table: Optional[str] = None) -> Dict[str, Any]:
     """Get schema information for a datastore."""
     try:
-        pool = get_pool()
-        row = await pool.fetchrow("SELECT * FROM datastores WHERE id = $1", datastore_id)
-        if not row:
+        datastore = await get_datastore(datastore_id)
+        if not datastore:
             return {"error": "Datastore not found"}
-        datastore = dict(row)
 
         ds_type = datastore["type"]
         if ds_type == "bigquery":
@@ -386,9 +778,36 @@ async def get_datastore_schema(datastore_id: str, dataset: Optional[str] = None,
 
 
 async def get_bigquery_schema(datastore: Dict[str, Any], dataset: Optional[str], table: Optional[str]):
-    """Get BigQuery schema information with enriched details."""
+    """Get BigQuery schema information with enriched details (cached for a few minutes)."""
+    return await _cached_schema(datastore, dataset, table, _introspect_bigquery_schema, _bigquery_schema_fingerprint)
+
+
+async def _bigquery_schema_fingerprint(datastore: Dict[str, Any], dataset: Optional[str], table: Optional[str]) -> Optional[str]:
+    # Only a dataset listing (one get_table per table) is costly enough to be worth probing
+    if table or not dataset:
+        return None
+    client = await get_bigquery_client(ensure_dict(datastore["config"]))
+    return await run_blocking(_bigquery_dataset_fingerprint, client, dataset)
+
+
+def _bigquery_dataset_fingerprint(client: bigquery.Client, dataset: str) -> Optional[str]:
+    """Dataset modification time plus its table ids: two list calls instead of one per table."""
+    try:
+        modified = client.get_dataset(dataset).modified
+        table_ids = sorted(t.table_id for t in client.list_tables(dataset, max_results=_SCHEMA_MAX_TABLES, page_size=_SCHEMA_MAX_TABLES))
+    except Exception:
+        return None
+    raw = json.dumps([str(modified), table_ids])
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+async def _introspect_bigquery_schema(datastore: Dict[str, Any], dataset: Optional[str], table: Optional[str]):
     client = await get_bigquery_client(ensure_dict(datastore["config"]))
+    # list_tables/get_table are blocking HTTP calls; keep them off the event loop
+    return await run_blocking(_bigquery_schema_sync, client, dataset, table)
+
 
+def _bigquery_schema_sync(client: bigquery.Client, dataset: Optional[str], table: Optional[str]):
     if table and dataset:
         table_ref = client.dataset(dataset).table(table)
         table_obj = client.get_table(table_ref)
@@ -411,7 +830,7 @@ async def get_bigquery_schema(datastore: Dict[str, Any], dataset: Optional[str],
         }
 
     elif dataset:
-        tables_list = list(client.list_tables(dataset))
+        tables_list = list(client.list_tables(dataset, max_results=_SCHEMA_MAX_TABLES, page_size=_SCHEMA_MAX_TABLES))
         tables = []
         for t in tables_list:
             table_info = {"name": t.table_id, "type": t.table_type}
@@ -429,7 +848,7 @@ async def get_bigquery_schema(datastore: Dict[str, Any], dataset: Optional[str],
         }
 
     else:
-        datasets_list = list(client.list_datasets())
+        datasets_list = list(client.list_datasets(page_size=_SCHEMA_MAX_TABLES))
         datasets = []
         for d in datasets_list:
             ds_info = {"name": d.dataset_id, "project": d.project}
@@ -448,10 +867,64 @@ async def get_bigquery_schema(datastore: Dict[str, Any], dataset: Optional[str],
 
 
 async def get_sql_schema(datastore: Dict[str, Any], database: Optional[str], table: Optional[str]):
-    """Get schema information for any SQLAlchemy-backed datastore (Postgres, MySQL, MSSQL, Athena)."""
+    """Get schema information for any SQLAlchemy-backed datastore (Postgres, MySQL, MSSQL, Athena), cached for a few minutes."""
+    return await _cached_schema(datastore, database, table, _introspect_sql_schema, _sql_schema_fingerprint)
+
+
+# Any DDL rewrites the pg_class / pg_attribute rows it touches, changing their xmin
+_PG_SCHEMA_FINGERPRINT_SQL = (
+    "SELECT md5(string_agg(c.oid::text || ':' || c.xmin::text || ':' || a.xmin::text, ',' ORDER BY c.oid, a.attnum)) "
+    "FROM pg_class c "
+    "JOIN pg_namespace n ON n.oid = c.relnamespace "
+    "JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 "
+    "WHERE c.relkind IN ('r', 'p', 'v', 'm') "
+    "AND n.nspname NOT IN ('pg_catalog', 'information_schema') AND n.nspname NOT LIKE 'pg_toast%'"
+)
+
+
+async def _sql_schema_fingerprint(datastore: Dict[str, Any], database: Optional[str], table: Optional[str]) -> Optional[str]:
+    if datastore["type"] != "postgres":
+        return None
+    engine = get_sa_engine(datastore["type"], ensure_dict(datastore["config"]))
+    return await run_blocking(_pg_schema_fingerprint, engine)
+
+
+def _pg_schema_fingerprint(engine) -> Optional[str]:
+    try:
+        with engine.connect() as conn:
+            return conn.execute(sa.text(_PG_SCHEMA_FINGERPRINT_SQL)).scalar()
+    except Exception:
+        return None
+
+
+def _pg_estimated_row_counts(engine, schema: str, table: Optional[str] = None) -> Dict[str, int]:
+    """Planner row estimates from pg_class.reltuples, avoiding a COUNT(*) scan per table."""
+    sql = (
+        "SELECT c.relname, c.reltuples::bigint FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = :schema AND c.relkind IN ('r', 'p', 'm')"
+    )
+    params = {"schema": schema}
+    if table:
+        sql += " AND c.relname = :table"
+        params["table"] = table
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(sa.text(sql), params).all()
+    except Exception:
+        return {}
+    # reltuples is -1 for tables that have never been analyzed
+    return {name: count for name, count in rows if count is not None and count >= 0}
+
+
+async def _introspect_sql_schema(datastore: Dict[str, Any], database: Optional[str], table: Optional[str]):
     ds_type = datastore["type"]
-    ds_config = ensure_dict(datastore["config"])
-    engine = get_sa_engine(ds_type, ds_config)
+    engine = get_sa_engine(ds_type, ensure_dict(datastore["config"]))
+    # Inspector calls run blocking driver queries; keep them off the event loop
+    return await run_blocking(_sql_schema_sync, engine, ds_type, database, table)
+
+
+def _sql_schema_sync(engine, ds_type: str, database: Optional[str], table: Optional[str]):
     inspector = sa_inspect(engine)
 
     default_schema = "public" if ds_type == "postgres" else None
@@ -472,18 +945,25 @@ async def get_sql_schema(datastore: Dict[str, Any], database: Optional[str], tab
                 "default": str(col.get("default", "")) if col.get("default") else None
             })
 
-        return {
+        result = {
             "type": "table_schema",
             "schema": schema,
             "table": table,
             "columns": column_info
         }
+        if ds_type == "postgres":
+            row_count = _pg_estimated_row_counts(engine, schema, table).get(table)
+            if row_count is not None:
+                result["row_count"] = row_count
+        return result
 
     elif database:
         try:
             table_names = inspector.get_table_names(schema=database)
         except Exception:
             table_names = inspector.get_table_names()
+        table_names = table_names[:_SCHEMA_MAX_TABLES]
+        row_counts = _pg_estimated_row_counts(engine, database) if ds_type == "postgres" else {}
         tables = []
         for t in table_names:
             table_info = {"name": t, "type": "table"}
@@ -492,6 +972,8 @@ async def get_sql_schema(datastore: Dict[str, Any], database: Optional[str], tab
                 table_info["column_count"] = len(cols)
             except Exception:
                 pass
+            if t in row_counts:
+                table_info["row_count"] = row_counts[t]
             tables.append(table_info)
         return {
             "type": "tables",
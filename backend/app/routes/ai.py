@@ -1,16 +1,18 @@
 import asyncio
-import json
-import os
+import contextlib
+import hashlib
+import itertools
+import logging
+import re
 import time
-from typing import Dict, Any, Optional, List, AsyncGenerator
+from typing import Dict, Any, Optional, List, AsyncGenerator, Tuple
 
-import requests
-from fastapi import APIRouter, HTTPException, Body, Depends, Request
+import orjson
+from fastapi import APIRouter, HTTPException, Body, Depends, Request, BackgroundTasks
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
 from ..db import get_pool
-
-_BACKEND_URL = os.getenv("BACKEND_URL", "https://nubi-backend-759628329757.us-central1.run.app")
 from ..auth import get_optional_user
 from ..prompts import (
     BOARD_SYSTEM_INSTRUCTION, EXPLORATION_SYSTEM_INSTRUCTION,
@@ -19,7 +21,7 @@ from ..prompts import (
 from ..helpers import strip_markdown_code_block, validate_html
 from ..query_engine import (
     execute_python_query, execute_query_direct,
-    get_datastore_schema, get_bigquery_schema, get_sql_schema,
+    get_datastore, get_datastore_schema, get_bigquery_schema, get_sql_schema, invalidate_datastore_cache,
 )
 from ..ai_tools import (
     GEMINI_TOOLS, get_tools_for_context,
@@ -29,10 +31,16 @@ from ..ai_tools import (
     create_or_update_query, delete_query, apply_code_edits,
     create_or_update_datastore, test_datastore_tool, save_keyfile_tool,
 )
-from ..llm import call_llm, LLMResponse, DEFAULT_MODEL, get_available_models, get_model_info
+from ..llm import call_llm, stream_llm, LLMResponse, DEFAULT_MODEL, get_available_models, get_model_info
+from .explore import run_explore
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["ai"])
 
+# Prefixes that mark a model reply as Python code rather than prose
+_PY_CODE_START_RE = re.compile(r"#|@|import|from|def|class|if|for|while|try|with|result|```")
+
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -52,16 +60,120 @@ async def _log_usage(user_id: Optional[str], chat_id: Optional[str], resp: LLMRe
         print(f"WARNING: Failed to log usage: {e}")
 
 
-def _chat_to_messages(chat: List[Dict[str, str]]) -> List[dict]:
-    messages = []
-    for msg in chat:
-        if not msg.get("content"):
+# Once a tool loop's conversation passes this many messages, older tool results
+# are cut down so every round doesn't resend them in full.
+_COMPACT_AFTER_MESSAGES = 30
+_KEEP_RECENT_MESSAGES = 10
+_COMPACT_RESULT_CHARS = 500
+
+
+def _compact_tool_history(messages: list) -> None:
+    """Truncate tool results outside the recent window, in place."""
+    if len(messages) <= _COMPACT_AFTER_MESSAGES:
+        return
+    for msg in messages[:-_KEEP_RECENT_MESSAGES]:
+        if msg.get("role") != "tool" or msg.get("compacted"):
             continue
+        content = msg.get("content", "")
+        if len(content) > _COMPACT_RESULT_CHARS:
+            msg["content"] = orjson.dumps({"truncated_result": content[:_COMPACT_RESULT_CHARS]}).decode()
+        msg["compacted"] = True
+
+
+_SSE_KEEPALIVE = 15  # seconds of silence before a comment frame is sent
+_SSE_PING = b": ping\n\n"
+# Stop intermediaries (nginx, Cloud Run front ends) from buffering or caching the stream
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def _sse(event: Dict[str, Any]) -> bytes:
+    """Encode one event as a Server-Sent Events data frame."""
+    return b"data: " + orjson.dumps(event, default=str, option=orjson.OPT_NON_STR_KEYS) + b"\n\n"
+
+
+async def _wait_for_disconnect(request: Request, interval: float = 1.0) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(interval)
+
+
+async def _abort_on_disconnect(request: Request, frames: AsyncGenerator[bytes, None]) -> AsyncGenerator[bytes, None]:
+    """
+    Relay SSE frames until the client goes away.
+
+    Each step of the producer races a disconnect watcher, so a closed browser tab
+    cancels the in-flight LLM call / tool execution instead of running it to completion.
+    """
+    watcher = asyncio.create_task(_wait_for_disconnect(request))
+    try:
+        while True:
+            step = asyncio.ensure_future(frames.__anext__())
+            while True:
+                done, _ = await asyncio.wait(
+                    {step, watcher}, timeout=_SSE_KEEPALIVE, return_when=asyncio.FIRST_COMPLETED,
+                )
+                if done:
+                    break
+                # Long LLM/tool step: keep proxies from idling the connection out
+                yield _SSE_PING
+            if not step.done():
+                step.cancel()
+                with contextlib.suppress(asyncio.CancelledError, StopAsyncIteration):
+                    await step
+                return
+            try:
+                frame = step.result()
+            except StopAsyncIteration:
+                return
+            yield frame
+    finally:
+        watcher.cancel()
+        await frames.aclose()
+
+
+# History budget for the exploration (query) paths, which resend the history on every attempt
+_HISTORY_TOKEN_BUDGET = 4000
+_CHARS_PER_TOKEN = 4  # rough estimate, good enough for budgeting
+
+
+def _chat_to_messages(chat: List[Dict[str, str]], token_budget: Optional[int] = None) -> List[dict]:
+    """
+    Convert chat history to LLM messages. Empty turns and consecutive
+    duplicates are dropped. With a ``token_budget``, turns are kept newest
+    first until it is spent; the most recent turn is always kept.
+    """
+    if not chat:
+        return []
+    budget = token_budget * _CHARS_PER_TOKEN if token_budget is not None else float("inf")
+    messages = []
+    newer = None
+    for msg in reversed(chat):
+        content = msg.get("content")
         role = "assistant" if msg.get("role") == "assistant" else "user"
-        messages.append({"role": role, "content": msg["content"]})
+        if not content or (role, content) == newer:
+            continue
+        if messages and len(content) > budget:
+            break
+        budget -= len(content)
+        newer = (role, content)
+        messages.append({"role": role, "content": content})
+    messages.reverse()
     return messages
 
 
+def _prepend_context(messages: List[dict], context_info: str) -> None:
+    """
+    Put per-request context (board, queries, datastores) at the start of the
+    first user turn, keeping the system instruction identical across requests
+    so providers can cache it.
+    """
+    if not context_info:
+        return
+    for msg in messages:
+        if msg["role"] == "user":
+            msg["content"] = context_info.strip() + "\n\n" + msg["content"]
+            return
+
+
 def _get_system_instruction(context: str) -> str:
     if context == "board":
         return BOARD_SYSTEM_INSTRUCTION
@@ -73,141 +185,363 @@ def _get_system_instruction(context: str) -> str:
         return GENERAL_SYSTEM_INSTRUCTION
 
 
+async def _tool_list_datastores(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    ds = await get_available_datastores(user_id=user_id, org_id=org_id)
+    return {"datastores": ds, "count": len(ds)}
+
+
+async def _tool_list_boards(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    boards = await get_available_boards()
+    return {"boards": boards, "count": len(boards)}
+
+
+async def _tool_list_board_queries(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    bid = args.get("board_id")
+    qs = await get_board_queries(bid) if bid else []
+    return {"queries": qs, "count": len(qs)}
+
+
+async def _tool_get_code(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    entity_type = args.get("type", "")
+    entity_id = args.get("id", "")
+    if not entity_id:
+        return {"error": "Missing id"}
+    if entity_type == "query":
+        return await get_query_code(entity_id)
+    elif entity_type == "board":
+        return await get_board_code(entity_id)
+    else:
+        return {"error": f"Unknown type '{entity_type}'. Use 'board' or 'query'."}
+
+
+async def _tool_search_code(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    entity_type = args.get("type", "")
+    entity_id = args.get("id", "")
+    search_term = args.get("search_term", "")
+    context_lines = args.get("context_lines", 3)
+    if not entity_id or not search_term:
+        return {"error": "Missing id or search_term"}
+    if entity_type == "query":
+        return await search_query_code(entity_id, search_term, context_lines)
+    elif entity_type == "board":
+        return await search_board_code(entity_id, search_term, context_lines)
+    else:
+        return {"error": f"Unknown type '{entity_type}'. Use 'board' or 'query'."}
+
+
+async def _tool_edit_code(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    entity_type = args.get("type", "")
+    entity_id = args.get("id", "")
+    edits = args.get("edits", [])
+    if not entity_id or not edits:
+        return {"error": "Missing id or edits"}
+    return await apply_code_edits(entity_type, entity_id, edits)
+
+
+async def _tool_get_query_code(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    qid = args.get("query_id")
+    return await get_query_code(qid) if qid else {"error": "Missing query_id"}
+
+
+async def _tool_get_board_code(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    bid = args.get("board_id")
+    return await get_board_code(bid) if bid else {"error": "Missing board_id"}
+
+
+async def _tool_search_board_code(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    return await search_board_code(
+        board_id=args.get("board_id", ""),
+        search_term=args.get("search_term", ""),
+        context_lines=args.get("context_lines", 3),
+    )
+
+
+async def _tool_search_query_code(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    return await search_query_code(
+        query_id=args.get("query_id", ""),
+        search_term=args.get("search_term", ""),
+        context_lines=args.get("context_lines", 3),
+    )
+
+
+async def _tool_create_or_update_query(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    return await create_or_update_query(
+        board_id=args.get("board_id"),
+        query_name=args.get("query_name"),
+        python_code=args.get("python_code"),
+        description=args.get("description", ""),
+        query_id=args.get("query_id"),
+    )
+
+
+async def _tool_delete_query(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    qid = args.get("query_id")
+    return await delete_query(qid) if qid else {"error": "Missing query_id"}
+
+
+async def _tool_get_datastore_schema(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    return await get_datastore_schema(
+        datastore_id=args.get("datastore_id"),
+        dataset=args.get("dataset"),
+        table=args.get("table"),
+    )
+
+
+async def _tool_run_query(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    result = await execute_python_query(args.get("python_code", ""), limit_rows=5)
+    if result.get("success") and result.get("row_count", 0) == 0:
+        result["warning"] = (
+            "ZERO ROWS RETURNED. This likely means the query has incorrect column names, "
+            "table names, or filter conditions. You MUST investigate."
+        )
+    return result
+
+
+async def _tool_execute_query_direct(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    return await execute_query_direct(
+        datastore_id=args.get("datastore_id", ""),
+        sql_query=args.get("sql_query", ""),
+        limit=args.get("limit", 100),
+    )
+
+
+async def _tool_create_or_update_datastore(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    return await create_or_update_datastore(
+        name=args.get("name", ""),
+        ds_type=args.get("type", ""),
+        config=args.get("config", {}),
+        datastore_id=args.get("datastore_id"),
+        user_id=user_id,
+        org_id=org_id,
+    )
+
+
+async def _tool_test_datastore(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    ds_id = args.get("datastore_id")
+    return await test_datastore_tool(ds_id) if ds_id else {"error": "Missing datastore_id"}
+
+
+async def _tool_save_keyfile(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    return await save_keyfile_tool(
+        json_content=args.get("json_content", ""),
+        user_id=user_id,
+        filename=args.get("filename", "keyfile.json"),
+    )
+
+
+_MANAGE_DATASTORE_ACTIONS = {
+    "create": _tool_create_or_update_datastore,
+    "update": _tool_create_or_update_datastore,
+    "test": _tool_test_datastore,
+    "save_keyfile": _tool_save_keyfile,
+}
+
+
+async def _tool_manage_datastore(args: dict, user_id: Optional[str], org_id: Optional[str]) -> dict:
+    action = args.get("action", "")
+    handler = _MANAGE_DATASTORE_ACTIONS.get(action)
+    if handler is None:
+        return {"error": f"Unknown manage_datastore action: {action}. Use 'create', 'update', 'test', or 'save_keyfile'."}
+    return await handler(args, user_id, org_id)
+
+
+_TOOL_HANDLERS = {
+    "list_datastores": _tool_list_datastores,
+    "list_boards": _tool_list_boards,
+    "list_board_queries": _tool_list_board_queries,
+    "get_code": _tool_get_code,
+    "search_code": _tool_search_code,
+    "edit_code": _tool_edit_code,
+    "create_or_update_query": _tool_create_or_update_query,
+    "delete_query": _tool_delete_query,
+    "get_datastore_schema": _tool_get_datastore_schema,
+    "run_query": _tool_run_query,
+    "execute_query_direct": _tool_execute_query_direct,
+    "manage_datastore": _tool_manage_datastore,
+    # Backward compat for old tool names
+    "get_query_code": _tool_get_query_code,
+    "get_board_code": _tool_get_board_code,
+    "search_board_code": _tool_search_board_code,
+    "search_query_code": _tool_search_query_code,
+    "create_or_update_datastore": _tool_create_or_update_datastore,
+    "test_datastore": _tool_test_datastore,
+    "save_keyfile": _tool_save_keyfile,
+}
+
+
 async def _execute_tool(func_name: str, func_args: dict, user_id: Optional[str] = None, org_id: Optional[str] = None) -> dict:
-    if func_name == "list_datastores":
-        ds = await get_available_datastores(user_id=user_id, org_id=org_id)
-        return {"datastores": ds, "count": len(ds)}
-    elif func_name == "list_boards":
-        boards = await get_available_boards()
-        return {"boards": boards, "count": len(boards)}
-    elif func_name == "list_board_queries":
-        bid = func_args.get("board_id")
-        qs = await get_board_queries(bid) if bid else []
-        return {"queries": qs, "count": len(qs)}
-    elif func_name == "get_code":
-        entity_type = func_args.get("type", "")
-        entity_id = func_args.get("id", "")
-        if not entity_id:
-            return {"error": "Missing id"}
-        if entity_type == "query":
-            return await get_query_code(entity_id)
-        elif entity_type == "board":
-            return await get_board_code(entity_id)
+    handler = _TOOL_HANDLERS.get(func_name)
+    if handler is None:
+        return {"error": f"Unknown function: {func_name}"}
+    return await handler(func_args, user_id, org_id)
+
+
+_default_board_cache: Dict[str, Any] = {"id": None, "fetched_at": 0}
+_DEFAULT_BOARD_TTL = 300  # 5 minutes
+
+
+async def _default_board_id() -> Optional[str]:
+    """Board that temporary test queries are attached to, cached for a few minutes."""
+    now = time.time()
+    if _default_board_cache["id"] and (now - _default_board_cache["fetched_at"]) < _DEFAULT_BOARD_TTL:
+        return _default_board_cache["id"]
+    row = await get_pool().fetchrow("SELECT id FROM boards LIMIT 1")
+    _default_board_cache["id"] = str(row["id"]) if row else None
+    _default_board_cache["fetched_at"] = now
+    return _default_board_cache["id"]
+
+
+async def _create_test_query(python_code: str, temp_query_ids: Optional[List[str]] = None) -> Optional[str]:
+    """
+    Insert a temporary query on the default board so generated code can be run through /explore.
+
+    The new id is appended to ``temp_query_ids`` so the route can delete it
+    once the response has been sent.
+    """
+    board_id = await _default_board_id()
+    if not board_id:
+        return None
+    row = await get_pool().fetchrow(
+        "INSERT INTO board_queries (name, board_id, python_code, ui_map) VALUES ($1,$2,$3,$4) RETURNING id",
+        f"_test_{int(time.time())}", board_id, python_code, "{}",
+    )
+    if not row:
+        return None
+    test_query_id = str(row["id"])
+    if temp_query_ids is not None:
+        temp_query_ids.append(test_query_id)
+    return test_query_id
+
+
+async def _delete_test_queries(temp_query_ids: List[str]) -> None:
+    """Background task: remove temporary test queries created during exploration."""
+    if not temp_query_ids:
+        return
+    try:
+        await get_pool().execute("DELETE FROM board_queries WHERE id = ANY($1::uuid[])", temp_query_ids)
+    except Exception:
+        logger.exception("Failed to delete temporary test queries")
+
+
+async def _run_test_query(test_query_id: str, datastore_id: Optional[str]) -> Dict[str, Any]:
+    """Run a saved query in-process exactly as POST /explore would."""
+    try:
+        return await asyncio.wait_for(run_explore(test_query_id, {}, datastore_id), timeout=30)
+    except asyncio.TimeoutError:
+        return {"result": None, "error": "Test query timed out after 30 seconds"}
+
+
+async def _prepare_exploration(datastore_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Load a datastore row together with the default test board in one round-trip.
+
+    The board id seeds the _default_board_id cache so the temp-query insert
+    later in the exploration loop needs no extra lookup.
+    """
+    row = await get_pool().fetchrow(
+        "SELECT d.*, (SELECT id FROM boards LIMIT 1) AS _default_board_id FROM datastores d WHERE d.id = $1",
+        datastore_id,
+    )
+    if not row:
+        return None
+    datastore = dict(row)
+    board_id = datastore.pop("_default_board_id")
+    _default_board_cache["id"] = str(board_id) if board_id else None
+    _default_board_cache["fetched_at"] = time.time()
+    return datastore
+
+
+# Tools without side effects; consecutive calls to these run concurrently
+_READ_ONLY_TOOLS = frozenset({
+    "list_datastores", "list_boards", "list_board_queries",
+    "get_code", "search_code", "get_query_code", "get_board_code",
+    "search_board_code", "search_query_code",
+    "get_datastore_schema", "run_query", "execute_query_direct",
+})
+# Read-only tools that run live SQL; a repeat may be deliberate (to see fresh data), so
+# their results are never memoized or shared between identical calls
+_LIVE_QUERY_TOOLS = frozenset({"run_query", "execute_query_direct"})
+# Mutating tools whose calls are independent as long as they target different queries
+_PER_QUERY_TOOLS = frozenset({"create_or_update_query"})
+
+
+def _tool_layers(function_calls: list) -> List[list]:
+    """
+    Split one turn's calls into consecutive layers that may run concurrently:
+    runs of read-only calls, runs of per-query writes to distinct queries, and
+    every other mutating call on its own. Call order across layers is preserved.
+    """
+    layers: List[list] = []
+    kind, targets = None, set()
+    for fc in function_calls:
+        target = None
+        if fc.name in _READ_ONLY_TOOLS:
+            k = "read"
+        elif fc.name in _PER_QUERY_TOOLS:
+            args = fc.args or {}
+            k = "query"
+            target = args.get("query_id") or (args.get("board_id"), args.get("query_name"))
         else:
-            return {"error": f"Unknown type '{entity_type}'. Use 'board' or 'query'."}
-    elif func_name == "search_code":
-        entity_type = func_args.get("type", "")
-        entity_id = func_args.get("id", "")
-        search_term = func_args.get("search_term", "")
-        context_lines = func_args.get("context_lines", 3)
-        if not entity_id or not search_term:
-            return {"error": "Missing id or search_term"}
-        if entity_type == "query":
-            return await search_query_code(entity_id, search_term, context_lines)
-        elif entity_type == "board":
-            return await search_board_code(entity_id, search_term, context_lines)
+            k = None
+        if layers and k is not None and k == kind and target not in targets:
+            layers[-1].append(fc)
         else:
-            return {"error": f"Unknown type '{entity_type}'. Use 'board' or 'query'."}
-    elif func_name == "edit_code":
-        entity_type = func_args.get("type", "")
-        entity_id = func_args.get("id", "")
-        edits = func_args.get("edits", [])
-        if not entity_id or not edits:
-            return {"error": "Missing id or edits"}
-        return await apply_code_edits(entity_type, entity_id, edits)
-    # Backward compat for old tool names
-    elif func_name == "get_query_code":
-        qid = func_args.get("query_id")
-        return await get_query_code(qid) if qid else {"error": "Missing query_id"}
-    elif func_name == "get_board_code":
-        bid = func_args.get("board_id")
-        return await get_board_code(bid) if bid else {"error": "Missing board_id"}
-    elif func_name == "search_board_code":
-        return await search_board_code(
-            board_id=func_args.get("board_id", ""),
-            search_term=func_args.get("search_term", ""),
-            context_lines=func_args.get("context_lines", 3),
-        )
-    elif func_name == "search_query_code":
-        return await search_query_code(
-            query_id=func_args.get("query_id", ""),
-            search_term=func_args.get("search_term", ""),
-            context_lines=func_args.get("context_lines", 3),
-        )
-    elif func_name == "create_or_update_query":
-        return await create_or_update_query(
-            board_id=func_args.get("board_id"),
-            query_name=func_args.get("query_name"),
-            python_code=func_args.get("python_code"),
-            description=func_args.get("description", ""),
-            query_id=func_args.get("query_id"),
-        )
-    elif func_name == "delete_query":
-        qid = func_args.get("query_id")
-        return await delete_query(qid) if qid else {"error": "Missing query_id"}
-    elif func_name == "get_datastore_schema":
-        return await get_datastore_schema(
-            datastore_id=func_args.get("datastore_id"),
-            dataset=func_args.get("dataset"),
-            table=func_args.get("table"),
-        )
-    elif func_name == "run_query":
-        result = await execute_python_query(func_args.get("python_code", ""), limit_rows=5)
-        if result.get("success") and result.get("row_count", 0) == 0:
-            result["warning"] = (
-                "ZERO ROWS RETURNED. This likely means the query has incorrect column names, "
-                "table names, or filter conditions. You MUST investigate."
-            )
+            layers.append([fc])
+            kind, targets = k, set()
+        if target is not None:
+            targets.add(target)
+    return layers
+
+
+async def _safe_execute_tool(fc, user_id: Optional[str] = None, org_id: Optional[str] = None) -> dict:
+    try:
+        return await _execute_tool(fc.name, fc.args, user_id=user_id, org_id=org_id)
+    except Exception as tool_err:
+        return {"error": f"Tool execution failed: {str(tool_err)}", "success": False}
+
+
+async def _execute_tool_batch(
+    function_calls: list,
+    user_id: Optional[str] = None,
+    org_id: Optional[str] = None,
+    cache: Optional[Dict[tuple, dict]] = None,
+) -> List[dict]:
+    """
+    Run one model turn's function calls, each independent layer (see _tool_layers) concurrently.
+
+    If a request-scoped ``cache`` dict is given, read-only results are reused for
+    identical calls later in the same request, except for live queries. Any
+    mutating call clears it.
+    """
+    if cache is None:
+        cache = {}
+    # Identical read-only calls within this batch share one in-flight execution
+    in_flight: Dict[tuple, asyncio.Future] = {}
+
+    async def run(fc) -> dict:
+        if fc.name not in _READ_ONLY_TOOLS:
+            cache.clear()
+            return await _safe_execute_tool(fc, user_id, org_id)
+        if fc.name in _LIVE_QUERY_TOOLS:
+            return await _safe_execute_tool(fc, user_id, org_id)
+        key = (fc.name, orjson.dumps(fc.args, option=orjson.OPT_SORT_KEYS, default=str))
+        if key in cache:
+            return cache[key]
+        if key not in in_flight:
+            in_flight[key] = asyncio.ensure_future(_safe_execute_tool(fc, user_id, org_id))
+        result = await in_flight[key]
+        if "error" in result and not result.get("success"):
+            return result
+        cache[key] = result
         return result
-    elif func_name == "execute_query_direct":
-        return await execute_query_direct(
-            datastore_id=func_args.get("datastore_id", ""),
-            sql_query=func_args.get("sql_query", ""),
-            limit=func_args.get("limit", 100),
-        )
-    elif func_name == "manage_datastore":
-        action = func_args.get("action", "")
-        if action in ("create", "update"):
-            return await create_or_update_datastore(
-                name=func_args.get("name", ""),
-                ds_type=func_args.get("type", ""),
-                config=func_args.get("config", {}),
-                datastore_id=func_args.get("datastore_id"),
-                user_id=user_id,
-                org_id=org_id,
-            )
-        elif action == "test":
-            ds_id = func_args.get("datastore_id")
-            return await test_datastore_tool(ds_id) if ds_id else {"error": "Missing datastore_id"}
-        elif action == "save_keyfile":
-            return await save_keyfile_tool(
-                json_content=func_args.get("json_content", ""),
-                user_id=user_id,
-                filename=func_args.get("filename", "keyfile.json"),
-            )
+
+    results: List[dict] = []
+    for layer in _tool_layers(function_calls):
+        if len(layer) == 1:
+            results.append(await run(layer[0]))
         else:
-            return {"error": f"Unknown manage_datastore action: {action}. Use 'create', 'update', 'test', or 'save_keyfile'."}
-    # Backward compat for old tool names
-    elif func_name == "create_or_update_datastore":
-        return await create_or_update_datastore(
-            name=func_args.get("name", ""),
-            ds_type=func_args.get("type", ""),
-            config=func_args.get("config", {}),
-            datastore_id=func_args.get("datastore_id"),
-            user_id=user_id,
-            org_id=org_id,
-        )
-    elif func_name == "test_datastore":
-        ds_id = func_args.get("datastore_id")
-        return await test_datastore_tool(ds_id) if ds_id else {"error": "Missing datastore_id"}
-    elif func_name == "save_keyfile":
-        return await save_keyfile_tool(
-            json_content=func_args.get("json_content", ""),
-            user_id=user_id,
-            filename=func_args.get("filename", "keyfile.json"),
-        )
-    else:
-        return {"error": f"Unknown function: {func_name}"}
+            results.extend(await asyncio.gather(*(run(fc) for fc in layer)))
+    return results
 
 
 # ---------------------------------------------------------------------------
@@ -216,12 +550,13 @@ async def _execute_tool(func_name: str, func_args: dict, user_id: Optional[str]
 
 @router.get("/models")
 async def list_models():
-    return get_available_models()
+    return await get_available_models()
 
 
 @router.post("/board-helper")
 async def board_helper(
     request: Request,
+    background_tasks: BackgroundTasks,
     code: Optional[str] = Body(default=""),
     user_prompt: str = Body(...),
     chat: List[Dict[str, str]] = Body(default=[]),
@@ -236,8 +571,10 @@ async def board_helper(
 
     try:
         if context == "query":
+            temp_query_ids: List[str] = []
+            background_tasks.add_task(_delete_test_queries, temp_query_ids)
             return await exploration_helper_with_testing(
-                code, user_prompt, chat, datastore_id, query_id, model, user_id
+                code, user_prompt, chat, datastore_id, query_id, model, user_id, temp_query_ids
             )
 
         system_instruction = BOARD_SYSTEM_INSTRUCTION
@@ -275,7 +612,7 @@ async def board_helper(
         return {"code": edited_code, "message": f"I've updated the {code_type} based on your request."}
 
     except Exception as e:
-        import traceback; traceback.print_exc()
+        logger.exception("board_helper failed")
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=f"AI helper failed: {str(e)}")
@@ -301,16 +638,19 @@ async def board_helper_stream(
 ):
     user = await get_optional_user(request)
     user_id = str(user["id"]) if user else None
+    # Temporary test queries created by the query context, deleted after the response
+    temp_query_ids: List[str] = []
 
-    async def generate_stream() -> AsyncGenerator[str, None]:
+    async def generate_stream() -> AsyncGenerator[bytes, None]:
         try:
             # --- Query context ---
             if context == "query":
                 async for event in exploration_helper_stream(
                     code, user_prompt, chat, datastore_id, query_id, board_id,
                     max_tool_iterations, temperature, model, user_id, chat_id,
+                    temp_query_ids,
                 ):
-                    yield f"data: {json.dumps(event)}\n\n"
+                    yield _sse(event)
                 return
 
             # --- Datastore context ---
@@ -320,7 +660,7 @@ async def board_helper_stream(
                     max_tool_iterations, temperature, model, user_id, chat_id,
                     uploaded_file_paths,
                 ):
-                    yield f"data: {json.dumps(event)}\n\n"
+                    yield _sse(event)
                 return
 
             # --- General context (home, portal, etc.) ---
@@ -330,7 +670,7 @@ async def board_helper_stream(
                     max_tool_iterations, temperature, model, user_id, chat_id,
                     uploaded_file_paths,
                 ):
-                    yield f"data: {json.dumps(event)}\n\n"
+                    yield _sse(event)
                 return
 
             # --- Board context (default) ---
@@ -364,7 +704,6 @@ async def board_helper_stream(
                         context_info += f"- {ds['name']} (Type: {ds['type']}, ID: {ds['id']})\n"
                     context_info += "(Use the ID value for @datastore in query code)\n"
                 context_info += "===================\n"
-                system_instruction = system_instruction + context_info
 
             user_message = f"User request: {user_prompt}"
             if code:
@@ -377,12 +716,14 @@ async def board_helper_stream(
 
             messages = _chat_to_messages(chat[-50:])
             messages.append({"role": "user", "content": user_message})
+            _prepend_context(messages, context_info)
 
-            model_info = get_model_info(model)
+            model_info = await get_model_info(model)
             use_tools = model_info.get("supports_tools", True)
             tools = get_tools_for_context("board") if use_tools else None
 
             tool_iteration = 0
+            tool_cache: Dict[tuple, dict] = {}
             edited_code = None
             raw_text = ""
             accumulated_text = ""
@@ -390,62 +731,63 @@ async def board_helper_stream(
             any_tools_called = False
             edit_code_used = False
             latest_edit_code = None
-            last_tool_results: List[dict] = []
             continuation_count = 0
             consecutive_empty = 0
 
             while tool_iteration < max_tool_iterations:
                 tool_iteration += 1
-                last_tool_results = []
 
                 if tool_iteration == max_tool_iterations - 5:
-                    yield f"data: {json.dumps({'type': 'progress', 'content': f'Approaching iteration limit ({tool_iteration}/{max_tool_iterations})...'})}\n\n"
+                    yield _sse({'type': 'progress', 'content': f'Approaching iteration limit ({tool_iteration}/{max_tool_iterations})...'})
 
+                _compact_tool_history(messages)
+                resp = None
                 try:
-                    resp = await call_llm(
+                    async for chunk in stream_llm(
                         model, messages,
                         system_instruction=system_instruction,
                         tools=tools,
                         temperature=temperature,
-                    )
+                    ):
+                        if isinstance(chunk, LLMResponse):
+                            resp = chunk
+                        else:
+                            yield _sse({'type': 'text_delta', 'content': chunk})
                 except Exception as llm_err:
-                    yield f"data: {json.dumps({'type': 'error', 'content': f'AI API error: {str(llm_err)}'})}\n\n"
+                    yield _sse({'type': 'error', 'content': f'AI API error: {str(llm_err)}'})
                     return
 
                 await _log_usage(user_id, chat_id, resp)
 
                 if resp.finish_reason in ("SAFETY", "RECITATION", "OTHER"):
-                    yield f"data: {json.dumps({'type': 'error', 'content': f'Response was blocked ({resp.finish_reason}). Try rephrasing.'})}\n\n"
+                    yield _sse({'type': 'error', 'content': f'Response was blocked ({resp.finish_reason}). Try rephrasing.'})
                     return
 
                 if resp.function_calls:
                     any_tools_called = True
                     consecutive_empty = 0
-                    last_tool_results = []
+                    zero_rows = False
 
                     tc_list = [{"name": fc.name, "args": fc.args, "id": fc.name} for fc in resp.function_calls]
                     messages.append({"role": "assistant", "tool_calls": tc_list})
 
                     for fc in resp.function_calls:
-                        yield f"data: {json.dumps({'type': 'tool_call', 'tool': fc.name, 'status': 'started', 'args': fc.args})}\n\n"
-
-                        try:
-                            result = await _execute_tool(fc.name, fc.args, user_id=user_id, org_id=organization_id)
-                        except Exception as tool_err:
-                            result = {"error": f"Tool execution failed: {str(tool_err)}", "success": False}
+                        yield _sse({'type': 'tool_call', 'tool': fc.name, 'status': 'started', 'args': fc.args})
+                    results = await _execute_tool_batch(resp.function_calls, user_id=user_id, org_id=organization_id, cache=tool_cache)
 
+                    for fc, result in zip(resp.function_calls, results):
                         is_error = "error" in result and not result.get("success")
                         if fc.name == "execute_query_direct" and result.get("success"):
                             rc = result.get("returned_rows", 0)
                             msg = f"Executed query: {rc} rows returned"
                             if result.get("truncated"):
                                 msg += f" (truncated from {result.get('total_rows', 0)} total rows)"
-                            yield f"data: {json.dumps({'type': 'progress', 'content': msg})}\n\n"
+                            yield _sse({'type': 'progress', 'content': msg})
 
                         if is_error:
-                            yield f"data: {json.dumps({'type': 'tool_result', 'tool': fc.name, 'status': 'error', 'error': str(result.get('error', ''))})}\n\n"
+                            yield _sse({'type': 'tool_result', 'tool': fc.name, 'status': 'error', 'error': str(result.get('error', ''))})
                         else:
-                            yield f"data: {json.dumps({'type': 'tool_result', 'tool': fc.name, 'status': 'success', 'result': result})}\n\n"
+                            yield _sse({'type': 'tool_result', 'tool': fc.name, 'status': 'success', 'result': result})
 
                         if fc.name in ("create_or_update_query", "delete_query") and result.get("success"):
                             query_created = True
@@ -454,27 +796,24 @@ async def board_helper_stream(
                             edit_code_used = True
                             latest_edit_code = result.get("new_code", "")
                             old = result.get("old_code", "")
-                            yield f"data: {json.dumps({'type': 'code_delta', 'old_code': old, 'new_code': latest_edit_code})}\n\n"
+                            yield _sse({'type': 'code_delta', 'old_code': old, 'new_code': latest_edit_code})
 
-                        last_tool_results.append({"tool": fc.name, "result": result})
+                        if fc.name in ("run_query", "create_or_update_query") and not zero_rows:
+                            test = result.get("test", {})
+                            zero_rows = (
+                                (result.get("success") and result.get("row_count", 0) == 0)
+                                or (test.get("success") and test.get("row_count", 0) == 0)
+                            )
 
                         messages.append({
                             "role": "tool",
                             "tool_call_id": fc.name,
                             "name": fc.name,
-                            "content": json.dumps(result, default=str),
+                            "content": orjson.dumps(result, default=str, option=orjson.OPT_NON_STR_KEYS).decode(),
                         })
 
-                    zero_rows = [
-                        r for r in last_tool_results
-                        if r["tool"] in ("run_query", "create_or_update_query")
-                        and (
-                            (r["result"].get("success") and r["result"].get("row_count", 0) == 0)
-                            or (r["result"].get("test", {}).get("success") and r["result"].get("test", {}).get("row_count", 0) == 0)
-                        )
-                    ]
                     if zero_rows:
-                        yield f"data: {json.dumps({'type': 'progress', 'content': 'Query returned 0 rows - investigating...'})}\n\n"
+                        yield _sse({'type': 'progress', 'content': 'Query returned 0 rows - investigating...'})
                         messages.append({
                             "role": "user",
                             "content": (
@@ -493,32 +832,32 @@ async def board_helper_stream(
                     if tool_iteration < max_tool_iterations:
                         continuation_count += 1
                         if continuation_count == 1:
-                            yield f"data: {json.dumps({'type': 'progress', 'content': 'Generating long response, please wait...'})}\n\n"
+                            yield _sse({'type': 'progress', 'content': 'Generating long response, please wait...'})
                         accumulated_text += raw_text
                         messages.append({"role": "assistant", "content": raw_text})
                         messages.append({"role": "user", "content": "Continue"})
                         continue
                     else:
-                        yield f"data: {json.dumps({'type': 'error', 'content': 'Response too long and hit iteration limit.'})}\n\n"
+                        yield _sse({'type': 'error', 'content': 'Response too long and hit iteration limit.'})
                         return
 
                 if accumulated_text:
                     raw_text = accumulated_text + raw_text
                     if continuation_count > 1:
-                        yield f"data: {json.dumps({'type': 'progress', 'content': f'Completed long response ({continuation_count} parts)'})}\n\n"
+                        yield _sse({'type': 'progress', 'content': f'Completed long response ({continuation_count} parts)'})
 
                 if not raw_text:
                     consecutive_empty += 1
 
                     if consecutive_empty >= 5:
                         if any_tools_called:
-                            yield f"data: {json.dumps({'type': 'final', 'code': '', 'message': 'Operations completed. The AI was unable to generate a summary.'})}\n\n"
+                            yield _sse({'type': 'final', 'code': '', 'message': 'Operations completed. The AI was unable to generate a summary.'})
                         else:
-                            yield f"data: {json.dumps({'type': 'error', 'content': 'Could not get a response from the AI. Please try again.'})}\n\n"
+                            yield _sse({'type': 'error', 'content': 'Could not get a response from the AI. Please try again.'})
                         return
 
                     if any_tools_called and tool_iteration < max_tool_iterations:
-                        yield f"data: {json.dumps({'type': 'progress', 'content': 'Continuing...'})}\n\n"
+                        yield _sse({'type': 'progress', 'content': 'Continuing...'})
                         if query_created:
                             nudge = "You successfully created/updated a query. Now provide a brief summary of what you did."
                         elif consecutive_empty >= 3:
@@ -529,7 +868,7 @@ async def board_helper_stream(
                         continue
 
                     if not any_tools_called and tool_iteration <= 2:
-                        yield f"data: {json.dumps({'type': 'progress', 'content': 'Gathering context...'})}\n\n"
+                        yield _sse({'type': 'progress', 'content': 'Gathering context...'})
                         messages.append({
                             "role": "user",
                             "content": (
@@ -540,28 +879,28 @@ async def board_helper_stream(
                         continue
 
                     if not any_tools_called:
-                        yield f"data: {json.dumps({'type': 'error', 'content': 'Could not understand your request. Please be more specific.'})}\n\n"
+                        yield _sse({'type': 'error', 'content': 'Could not understand your request. Please be more specific.'})
                         return
 
-                    yield f"data: {json.dumps({'type': 'final', 'code': '', 'message': 'Tools executed but could not generate a final response.'})}\n\n"
+                    yield _sse({'type': 'final', 'code': '', 'message': 'Tools executed but could not generate a final response.'})
                     return
 
                 if edit_code_used:
                     summary = raw_text.strip() if raw_text.strip() else "Code updated via targeted edits."
-                    yield f"data: {json.dumps({'type': 'final', 'code': latest_edit_code or '', 'message': summary})}\n\n"
+                    yield _sse({'type': 'final', 'code': latest_edit_code or '', 'message': summary})
                     return
 
-                edited_code = strip_markdown_code_block(raw_text.strip())
+                edited_code = await asyncio.to_thread(strip_markdown_code_block, raw_text.strip())
 
                 is_html = edited_code and ("<!DOCTYPE" in edited_code or "<html" in edited_code.lower())
                 is_explanation = len(edited_code) < 100 or ("<" not in edited_code)
 
                 if not is_html or is_explanation:
                     if query_created or (any_tools_called and not is_html):
-                        yield f"data: {json.dumps({'type': 'final', 'code': '', 'message': raw_text.strip()})}\n\n"
+                        yield _sse({'type': 'final', 'code': '', 'message': raw_text.strip()})
                         return
                     if tool_iteration < max_tool_iterations:
-                        yield f"data: {json.dumps({'type': 'progress', 'content': 'Received text instead of HTML, requesting code...'})}\n\n"
+                        yield _sse({'type': 'progress', 'content': 'Received text instead of HTML, requesting code...'})
                         messages.append({"role": "assistant", "content": raw_text})
                         messages.append({
                             "role": "user",
@@ -569,51 +908,52 @@ async def board_helper_stream(
                         })
                         continue
                     else:
-                        yield f"data: {json.dumps({'type': 'error', 'content': 'AI returned text instead of HTML code.'})}\n\n"
+                        yield _sse({'type': 'error', 'content': 'AI returned text instead of HTML code.'})
                         return
 
                 break
 
             if edit_code_used and latest_edit_code:
-                yield f"data: {json.dumps({'type': 'final', 'code': latest_edit_code, 'message': 'Code updated via targeted edits.'})}\n\n"
+                yield _sse({'type': 'final', 'code': latest_edit_code, 'message': 'Code updated via targeted edits.'})
                 return
 
             if not edited_code:
-                yield f"data: {json.dumps({'type': 'error', 'content': 'Failed to generate code'})}\n\n"
+                yield _sse({'type': 'error', 'content': 'Failed to generate code'})
                 return
 
             if tool_iteration >= max_tool_iterations:
-                yield f"data: {json.dumps({'type': 'progress', 'content': f'Reached iteration limit ({max_tool_iterations}).'})}\n\n"
+                yield _sse({'type': 'progress', 'content': f'Reached iteration limit ({max_tool_iterations}).'})
 
-            yield f"data: {json.dumps({'type': 'progress', 'content': f'Code generated ({len(edited_code)} characters)'})}\n\n"
-            yield f"data: {json.dumps({'type': 'progress', 'content': 'Validating code...'})}\n\n"
+            yield _sse({'type': 'progress', 'content': f'Code generated ({len(edited_code)} characters)'})
+            yield _sse({'type': 'progress', 'content': 'Validating code...'})
 
-            validation = validate_html(edited_code)
-            vsummary = validation["summary"]
-            if validation["valid"]:
-                yield f"data: {json.dumps({'type': 'progress', 'content': f'{vsummary}'})}\n\n"
-            else:
-                yield f"data: {json.dumps({'type': 'progress', 'content': f'{vsummary}'})}\n\n"
-            for err in validation.get("errors", []):
-                yield f"data: {json.dumps({'type': 'progress', 'content': f'  Error: {err}'})}\n\n"
-            for warn in validation.get("warnings", []):
-                yield f"data: {json.dumps({'type': 'progress', 'content': f'  Warning: {warn}'})}\n\n"
-            for info_item in validation.get("info", []):
-                yield f"data: {json.dumps({'type': 'progress', 'content': f'  {info_item}'})}\n\n"
+            validation = await asyncio.to_thread(validate_html, edited_code)
+            yield _sse({
+                'type': 'validation_report',
+                'summary': validation["summary"],
+                'errors': validation.get("errors", []),
+                'warnings': validation.get("warnings", []),
+                'info': validation.get("info", []),
+            })
 
             if code:
-                yield f"data: {json.dumps({'type': 'code_delta', 'old_code': code, 'new_code': edited_code})}\n\n"
+                yield _sse({'type': 'code_delta', 'old_code': code, 'new_code': edited_code})
 
             message = f"HTML {'validated and ' if validation['valid'] else ''}generated!"
             if validation.get("warnings"):
                 message += f"\n\nNote: {len(validation['warnings'])} warning(s)."
-            yield f"data: {json.dumps({'type': 'final', 'code': edited_code, 'message': message, 'validation': validation})}\n\n"
+            yield _sse({'type': 'final', 'code': edited_code, 'message': message, 'validation': validation})
 
         except Exception as e:
-            import traceback; traceback.print_exc()
-            yield f"data: {json.dumps({'type': 'error', 'content': str(e)})}\n\n"
+            logger.exception("board_helper_stream failed")
+            yield _sse({'type': 'error', 'content': str(e)})
 
-    return StreamingResponse(generate_stream(), media_type="text/event-stream")
+    return StreamingResponse(
+        _abort_on_disconnect(request, generate_stream()),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS,
+        background=BackgroundTask(_delete_test_queries, temp_query_ids),
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -657,14 +997,13 @@ async def _datastore_context_stream(
         context_info += f"\nUploaded files available: {', '.join(uploaded_file_paths)}\n"
         context_info += "These files have been uploaded and their paths can be used in datastore config (e.g. keyfile_path).\n"
 
-    system_instruction = system_instruction + context_info
-
     user_message = f"User request: {user_prompt}"
 
     messages = _chat_to_messages(chat[-50:])
     messages.append({"role": "user", "content": user_message})
+    _prepend_context(messages, context_info)
 
-    model_info = get_model_info(model)
+    model_info = await get_model_info(model)
     use_tools = model_info.get("supports_tools", True)
     tools = get_tools_for_context("datastore") if use_tools else None
 
@@ -702,14 +1041,13 @@ async def _general_context_stream(
     if uploaded_file_paths:
         context_info += f"\nUploaded files available: {', '.join(uploaded_file_paths)}\n"
 
-    system_instruction = system_instruction + context_info
-
     user_message = f"User request: {user_prompt}"
 
     messages = _chat_to_messages(chat[-50:])
     messages.append({"role": "user", "content": user_message})
+    _prepend_context(messages, context_info)
 
-    model_info = get_model_info(model)
+    model_info = await get_model_info(model)
     use_tools = model_info.get("supports_tools", True)
     tools = get_tools_for_context("general") if use_tools else None
 
@@ -736,6 +1074,7 @@ async def _tool_loop_stream(
     organization_id: Optional[str] = None,
 ) -> AsyncGenerator[Dict[str, Any], None]:
     tool_iteration = 0
+    tool_cache: Dict[tuple, dict] = {}
     any_tools_called = False
     accumulated_text = ""
     continuation_count = 0
@@ -746,13 +1085,19 @@ async def _tool_loop_stream(
     while tool_iteration < max_tool_iterations:
         tool_iteration += 1
 
+        _compact_tool_history(messages)
+        resp = None
         try:
-            resp = await call_llm(
+            async for chunk in stream_llm(
                 model, messages,
                 system_instruction=system_instruction,
                 tools=tools,
                 temperature=temperature,
-            )
+            ):
+                if isinstance(chunk, LLMResponse):
+                    resp = chunk
+                else:
+                    yield {"type": "text_delta", "content": chunk}
         except Exception as llm_err:
             yield {"type": "error", "content": f"AI API error: {str(llm_err)}"}
             return
@@ -771,12 +1116,9 @@ async def _tool_loop_stream(
 
             for fc in resp.function_calls:
                 yield {"type": "tool_call", "tool": fc.name, "status": "started", "args": fc.args}
+            results = await _execute_tool_batch(resp.function_calls, user_id=user_id, org_id=organization_id, cache=tool_cache)
 
-                try:
-                    result = await _execute_tool(fc.name, fc.args, user_id=user_id, org_id=organization_id)
-                except Exception as tool_err:
-                    result = {"error": f"Tool execution failed: {str(tool_err)}", "success": False}
-
+            for fc, result in zip(resp.function_calls, results):
                 is_error = "error" in result and not result.get("success")
 
                 if fc.name == "execute_query_direct" and result.get("success"):
@@ -799,7 +1141,7 @@ async def _tool_loop_stream(
                     "role": "tool",
                     "tool_call_id": fc.name,
                     "name": fc.name,
-                    "content": json.dumps(result, default=str),
+                    "content": orjson.dumps(result, default=str, option=orjson.OPT_NON_STR_KEYS).decode(),
                 })
             continue
 
@@ -847,6 +1189,92 @@ async def _tool_loop_stream(
 # Exploration (query) helpers
 # ---------------------------------------------------------------------------
 
+# Task memory: first-attempt requests -> generated code that passed its test,
+# kept while its pass/fault record says it is more likely to pass than not.
+_MEMORY_MIN_UTILITY = 0.5
+
+
+def _generation_key(
+    model: str,
+    user_prompt: str,
+    code: str,
+    schema_info: Optional[str],
+    chat: List[Dict[str, str]],
+    datastore_id: Optional[str],
+    user_id: Optional[str],
+) -> str:
+    """
+    Content hash of everything that shapes a first-attempt generation, scoped
+    to the datastore and user so remembered code never crosses tenants.
+    """
+    raw = (
+        f"{datastore_id or ''}|{user_id or ''}|{model}|{user_prompt}|{code}|{schema_info or ''}|".encode()
+        + orjson.dumps(chat, default=str)
+    )
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+async def _recall_generation(key: str) -> Optional[str]:
+    """Code remembered for this request whose (pass + 1) / (pass + fault + 2) utility clears the bar."""
+    try:
+        return await get_pool().fetchval(
+            "SELECT code FROM exploration_memory WHERE request_hash = $1 "
+            "AND (pass_count + 1)::float / (pass_count + fault_count + 2) > $2",
+            key, _MEMORY_MIN_UTILITY,
+        )
+    except Exception:
+        logger.exception("Exploration memory lookup failed")
+        return None
+
+
+async def _record_generation(key: str, generated_code: str, passed: bool) -> None:
+    """Update the pass/fault record for a request; only passing code is ever stored."""
+    try:
+        if passed:
+            await get_pool().execute(
+                "INSERT INTO exploration_memory (request_hash, code, pass_count) VALUES ($1, $2, 1) "
+                "ON CONFLICT (request_hash) DO UPDATE SET "
+                "pass_count = CASE WHEN exploration_memory.code = EXCLUDED.code THEN exploration_memory.pass_count + 1 ELSE 1 END, "
+                "fault_count = CASE WHEN exploration_memory.code = EXCLUDED.code THEN exploration_memory.fault_count ELSE 0 END, "
+                "code = EXCLUDED.code, updated_at = now()",
+                key, generated_code,
+            )
+        else:
+            await get_pool().execute(
+                "UPDATE exploration_memory SET fault_count = fault_count + 1, updated_at = now() "
+                "WHERE request_hash = $1 AND code = $2",
+                key, generated_code,
+            )
+    except Exception:
+        logger.exception("Exploration memory update failed")
+
+
+async def _fetch_schema_info(datastore_id: str) -> Tuple[Optional[str], Optional[str]]:
+    """Summarize a datastore's datasets/schemas for the prompt. Returns (schema_info, progress note)."""
+    datastore = await _prepare_exploration(datastore_id)
+    if not datastore:
+        return None, None
+    if datastore["type"] == "bigquery":
+        schema_result = await get_bigquery_schema(datastore, None, None)
+        datasets = schema_result.get("datasets", [])
+        schema_parts = ["BigQuery project datasets:"]
+        for ds in datasets:
+            tables = ds.get("tables", [])
+            schema_parts.append(f"\nDataset: {ds['name']} ({len(tables)} tables)")
+            for t in tables[:20]:
+                schema_parts.append(f"  - {ds['name']}.{t['name']}")
+        total_tables = sum(len(d.get("tables", [])) for d in datasets)
+        return "\n".join(schema_parts), f"Schema: {len(datasets)} datasets, {total_tables} tables"
+    elif datastore["type"] == "postgres":
+        schema_result = await get_sql_schema(datastore, None, None)
+        schemas = schema_result.get("schemas", [])
+        schema_parts = ["PostgreSQL schemas:"]
+        for s in schemas:
+            schema_parts.append(f"  - {s['name']}")
+        return "\n".join(schema_parts), f"Schema: {len(schemas)} schemas"
+    return None, None
+
+
 async def exploration_helper_stream(
     code: str,
     user_prompt: str,
@@ -859,38 +1287,12 @@ async def exploration_helper_stream(
     model: str = DEFAULT_MODEL,
     user_id: Optional[str] = None,
     chat_id: Optional[str] = None,
+    temp_query_ids: Optional[List[str]] = None,
 ) -> AsyncGenerator[Dict[str, Any], None]:
     max_attempts = 5
 
-    schema_info = None
-    if datastore_id:
-        try:
-            pool = get_pool()
-            ds_row = await pool.fetchrow("SELECT * FROM datastores WHERE id = $1", datastore_id)
-            if ds_row:
-                datastore = dict(ds_row)
-                if datastore["type"] == "bigquery":
-                    schema_result = await get_bigquery_schema(datastore, None, None)
-                    datasets = schema_result.get("datasets", [])
-                    schema_parts = ["BigQuery project datasets:"]
-                    for ds in datasets:
-                        tables = ds.get("tables", [])
-                        schema_parts.append(f"\nDataset: {ds['name']} ({len(tables)} tables)")
-                        for t in tables[:20]:
-                            schema_parts.append(f"  - {ds['name']}.{t['name']}")
-                    schema_info = "\n".join(schema_parts)
-                    total_tables = sum(len(d.get("tables", [])) for d in datasets)
-                    yield {"type": "progress", "content": f"Schema: {len(datasets)} datasets, {total_tables} tables"}
-                elif datastore["type"] == "postgres":
-                    schema_result = await get_sql_schema(datastore, None, None)
-                    schemas = schema_result.get("schemas", [])
-                    schema_parts = ["PostgreSQL schemas:"]
-                    for s in schemas:
-                        schema_parts.append(f"  - {s['name']}")
-                    schema_info = "\n".join(schema_parts)
-                    yield {"type": "progress", "content": f"Schema: {len(schemas)} schemas"}
-        except Exception as e:
-            yield {"type": "progress", "content": f"Schema fetch failed: {str(e)}"}
+    # Schema discovery is independent of the context lookups below; run it alongside them
+    schema_task = asyncio.create_task(_fetch_schema_info(datastore_id)) if datastore_id else None
 
     context_info = ""
     try:
@@ -933,9 +1335,24 @@ async def exploration_helper_stream(
         except Exception as e:
             yield {"type": "progress", "content": f"Could not fetch query info: {str(e)}"}
 
-    model_info = get_model_info(model)
+    schema_info = None
+    if schema_task:
+        try:
+            schema_info, schema_note = await schema_task
+            if schema_note:
+                yield {"type": "progress", "content": schema_note}
+        except Exception as e:
+            yield {"type": "progress", "content": f"Schema fetch failed: {str(e)}"}
+
+    model_info = await get_model_info(model)
     use_tools = model_info.get("supports_tools", True)
     tools = get_tools_for_context("query") if use_tools else None
+    tool_cache: Dict[tuple, dict] = {}
+    history = _chat_to_messages(chat[-50:], _HISTORY_TOKEN_BUDGET)
+    # Created on the first test and reused by later attempts
+    test_query_id = query_id
+    # Code that already failed its test; regenerating it means the retry loop is stuck
+    failed_code_hashes: set = set()
 
     for attempt in range(1, max_attempts + 1):
         try:
@@ -958,7 +1375,7 @@ async def exploration_helper_stream(
                 else:
                     user_message += f"\n\nMultiple attempts failed. Last error: {last_error}\n\nTry SELECT * FROM dataset.table LIMIT 10."
 
-            messages = _chat_to_messages(chat[-50:])
+            messages = list(history)
             messages.append({"role": "user", "content": user_message})
 
             generated_code = None
@@ -973,13 +1390,19 @@ async def exploration_helper_stream(
                 if tool_iteration == max_tool_iterations - 5:
                     yield {"type": "progress", "content": f"Approaching iteration limit ({tool_iteration}/{max_tool_iterations})..."}
 
+                _compact_tool_history(messages)
+                resp = None
                 try:
-                    resp = await call_llm(
+                    async for chunk in stream_llm(
                         model, messages,
                         system_instruction=EXPLORATION_SYSTEM_INSTRUCTION,
                         tools=tools,
                         temperature=0.2 if attempt > 1 else temperature,
-                    )
+                    ):
+                        if isinstance(chunk, LLMResponse):
+                            resp = chunk
+                        else:
+                            yield {"type": "text_delta", "content": chunk}
                 except Exception as llm_err:
                     raise Exception(f"AI API error: {str(llm_err)}")
 
@@ -994,12 +1417,9 @@ async def exploration_helper_stream(
 
                     for fc in resp.function_calls:
                         yield {"type": "tool_call", "tool": fc.name, "status": "started", "args": fc.args}
+                    results = await _execute_tool_batch(resp.function_calls, user_id=user_id, cache=tool_cache)
 
-                        try:
-                            result = await _execute_tool(fc.name, fc.args, user_id=user_id)
-                        except Exception as tool_err:
-                            result = {"error": f"Tool execution failed: {str(tool_err)}", "success": False}
-
+                    for fc, result in zip(resp.function_calls, results):
                         is_err = "error" in result and not result.get("success")
 
                         if fc.name == "execute_query_direct" and result.get("success"):
@@ -1024,7 +1444,7 @@ async def exploration_helper_stream(
                             "role": "tool",
                             "tool_call_id": fc.name,
                             "name": fc.name,
-                            "content": json.dumps(result, default=str),
+                            "content": orjson.dumps(result, default=str, option=orjson.OPT_NON_STR_KEYS).decode(),
                         })
                     continue
 
@@ -1053,9 +1473,9 @@ async def exploration_helper_stream(
                     yield {"type": "final", "code": generated_code or "", "message": summary}
                     return
 
-                if raw_text.strip():
-                    stripped = raw_text.strip()
-                    if not stripped.startswith(("#", "@", "import", "from", "def", "class", "if", "for", "while", "try", "with", "result", "```")):
+                stripped = raw_text.strip()
+                if stripped:
+                    if not _PY_CODE_START_RE.match(stripped):
                         yield {"type": "progress", "content": "AI returned text instead of code, reprompting..."}
                         messages.append({"role": "assistant", "content": raw_text})
                         messages.append({"role": "user", "content": "Output ONLY valid Python code. No explanations."})
@@ -1077,6 +1497,21 @@ async def exploration_helper_stream(
             if not generated_code:
                 raise Exception("Failed to generate code")
 
+            code_hash = hashlib.blake2b(generated_code.encode(), digest_size=16).digest()
+            if code_hash in failed_code_hashes:
+                yield {"type": "progress", "content": "Model produced identical code; stopping retries"}
+                yield {
+                    "type": "needs_user_input", "code": generated_code, "error": last_error,
+                    "message": f"Still failing:\n\n```\n{last_error}\n```\n\nHow would you like to proceed?",
+                    "test_passed": False,
+                }
+                yield {
+                    "type": "final", "code": generated_code,
+                    "message": f"Code generated but not working yet.\n\nError: {last_error[:200]}...",
+                    "test_passed": False, "attempts": attempt, "error": last_error,
+                }
+                return
+
             yield {"type": "progress", "content": f"Code generated ({len(generated_code)} characters)"}
             if code:
                 yield {"type": "code_delta", "old_code": code, "new_code": generated_code}
@@ -1085,31 +1520,18 @@ async def exploration_helper_stream(
 
             if query_id or datastore_id:
                 yield {"type": "progress", "content": "Testing generated code..."}
-                test_query_id = query_id
+                code_saved = False
                 if not test_query_id:
                     yield {"type": "progress", "content": "  Creating temporary test query..."}
-                    pool = get_pool()
-                    board_row = await pool.fetchrow("SELECT id FROM boards LIMIT 1")
-                    if board_row:
-                        temp_row = await pool.fetchrow(
-                            "INSERT INTO board_queries (name, board_id, python_code, ui_map) VALUES ($1,$2,$3,$4) RETURNING id",
-                            f"_test_{int(time.time())}", str(board_row["id"]), generated_code, "{}",
-                        )
-                        if temp_row:
-                            test_query_id = str(temp_row["id"])
+                    test_query_id = await _create_test_query(generated_code, temp_query_ids)
+                    code_saved = True
 
                 if test_query_id:
                     try:
-                        pool = get_pool()
-                        await pool.execute("UPDATE board_queries SET python_code=$1 WHERE id=$2", generated_code, test_query_id)
-                        test_response = await asyncio.to_thread(
-                            requests.post,
-                            f"{_BACKEND_URL}/explore",
-                            json={"query_id": test_query_id, "args": {}, "datastore_id": datastore_id},
-                            timeout=30,
-                        )
-                        test_data = test_response.json() if test_response.ok else {}
-                        test_error_msg = test_data.get("error") or (test_data.get("detail") if not test_response.ok else None)
+                        if not code_saved:
+                            await get_pool().execute("UPDATE board_queries SET python_code=$1 WHERE id=$2", generated_code, test_query_id)
+                        test_data = await _run_test_query(test_query_id, datastore_id)
+                        test_error_msg = test_data.get("error")
 
                         if not test_error_msg and test_data.get("result") is not None:
                             row_count = test_data.get("count", 0)
@@ -1117,7 +1539,7 @@ async def exploration_helper_stream(
                             yield {"type": "test_result", "success": True, "row_count": row_count}
                             if test_data.get("table") and len(test_data["table"]) > 0:
                                 first_row = test_data["table"][0]
-                                sample = ", ".join([f"{k}={v}" for k, v in list(first_row.items())[:3]])
+                                sample = ", ".join([f"{k}={v}" for k, v in itertools.islice(first_row.items(), 3)])
                                 yield {"type": "progress", "content": f"  Sample: {sample}..."}
                             yield {
                                 "type": "final", "code": generated_code,
@@ -1127,6 +1549,7 @@ async def exploration_helper_stream(
                             return
                         else:
                             last_error = test_error_msg or "Unknown error"
+                            failed_code_hashes.add(code_hash)
                             yield {"type": "progress", "content": f"Test failed: {last_error}"}
                             yield {"type": "test_result", "success": False, "error": last_error}
                             if attempt == max_attempts:
@@ -1187,6 +1610,7 @@ async def exploration_helper_with_testing(
     query_id: Optional[str],
     model: str = DEFAULT_MODEL,
     user_id: Optional[str] = None,
+    temp_query_ids: Optional[List[str]] = None,
 ) -> Dict[str, Any]:
     progress_log: List[str] = []
     max_attempts = 5
@@ -1195,21 +1619,26 @@ async def exploration_helper_with_testing(
     if datastore_id:
         try:
             progress_log.append("Fetching database schema...")
-            pool = get_pool()
-            ds_row = await pool.fetchrow("SELECT * FROM datastores WHERE id = $1", datastore_id)
-            if ds_row:
-                datastore = dict(ds_row)
+            datastore = await _prepare_exploration(datastore_id)
+            if datastore:
                 if datastore["type"] == "bigquery":
-                    schema_result = await get_bigquery_schema(datastore, None, None)
-                    schema_info = f"BigQuery datasets: {', '.join([d['name'] for d in schema_result.get('datasets', [])])}"
-                    progress_log.append(f"Found {len(schema_result.get('datasets', []))} datasets")
+                    datasets = (await get_bigquery_schema(datastore, None, None)).get("datasets", [])
+                    schema_info = f"BigQuery datasets: {', '.join([d['name'] for d in datasets])}"
+                    progress_log.append(f"Found {len(datasets)} datasets")
                 elif datastore["type"] == "postgres":
-                    schema_result = await get_sql_schema(datastore, None, None)
-                    schema_info = f"PostgreSQL schemas: {', '.join([s['name'] for s in schema_result.get('schemas', [])])}"
-                    progress_log.append(f"Found {len(schema_result.get('schemas', []))} schemas")
+                    schemas = (await get_sql_schema(datastore, None, None)).get("schemas", [])
+                    schema_info = f"PostgreSQL schemas: {', '.join([s['name'] for s in schemas])}"
+                    progress_log.append(f"Found {len(schemas)} schemas")
         except Exception as e:
             progress_log.append(f"Schema fetch failed: {str(e)}")
 
+    history = _chat_to_messages(chat[-50:], _HISTORY_TOKEN_BUDGET)
+    generation_key = _generation_key(model, user_prompt, code, schema_info, chat[-50:], datastore_id, user_id)
+    # Created on the first test and reused by later attempts
+    test_query_id = query_id
+    # Code that already failed its test; regenerating it means the retry loop is stuck
+    failed_code_hashes: set = set()
+
     for attempt in range(1, max_attempts + 1):
         try:
             progress_log.append(f"\nAttempt {attempt}/{max_attempts}: Generating Python code...")
@@ -1223,46 +1652,50 @@ async def exploration_helper_with_testing(
             if attempt > 1 and "last_error" in dir():
                 user_message += f"\n\nPrevious error: {last_error}\n\nTry a simpler approach."
 
-            messages = _chat_to_messages(chat[-50:])
-            messages.append({"role": "user", "content": user_message})
+            # Only the first attempt consults memory; retries carry the previous error
+            generated_code = await _recall_generation(generation_key) if attempt == 1 else None
+            if generated_code:
+                progress_log.append("Reusing previously tested code")
+            else:
+                messages = list(history)
+                messages.append({"role": "user", "content": user_message})
 
-            resp = await call_llm(model, messages, system_instruction=EXPLORATION_SYSTEM_INSTRUCTION, temperature=0.2 if attempt > 1 else 0.3)
-            await _log_usage(user_id, None, resp)
+                resp = await call_llm(model, messages, system_instruction=EXPLORATION_SYSTEM_INSTRUCTION, temperature=0.2 if attempt > 1 else 0.3)
+                await _log_usage(user_id, None, resp)
 
-            raw_text = resp.text or ""
-            if not raw_text:
-                raise Exception("AI returned no content")
+                raw_text = resp.text or ""
+                if not raw_text:
+                    raise Exception("AI returned no content")
 
-            generated_code = strip_markdown_code_block(raw_text.strip())
+                generated_code = strip_markdown_code_block(raw_text.strip())
+
+            code_hash = hashlib.blake2b(generated_code.encode(), digest_size=16).digest()
+            if code_hash in failed_code_hashes:
+                progress_log.append("Model produced identical code; stopping retries")
+                return {
+                    "code": generated_code,
+                    "message": f"Generated but failed after {attempt} attempts.\n\n" + "\n".join(progress_log),
+                    "progress": progress_log, "test_passed": False, "attempts": attempt, "error": last_error,
+                }
             progress_log.append(f"Code generated ({len(generated_code)} characters)")
 
             if query_id or datastore_id:
                 progress_log.append("Testing...")
-                test_query_id = query_id
+                code_saved = False
                 if not test_query_id:
-                    pool = get_pool()
-                    board_row = await pool.fetchrow("SELECT id FROM boards LIMIT 1")
-                    if board_row:
-                        temp_row = await pool.fetchrow(
-                            "INSERT INTO board_queries (name, board_id, python_code, ui_map) VALUES ($1,$2,$3,$4) RETURNING id",
-                            f"_test_{int(time.time())}", str(board_row["id"]), generated_code, "{}",
-                        )
-                        if temp_row:
-                            test_query_id = str(temp_row["id"])
+                    test_query_id = await _create_test_query(generated_code, temp_query_ids)
+                    code_saved = True
                 if test_query_id:
                     try:
-                        pool = get_pool()
-                        await pool.execute("UPDATE board_queries SET python_code=$1 WHERE id=$2", generated_code, test_query_id)
-                        test_response = await asyncio.to_thread(
-                            requests.post, f"{_BACKEND_URL}/explore",
-                            json={"query_id": test_query_id, "args": {}, "datastore_id": datastore_id}, timeout=30,
-                        )
-                        test_data = test_response.json() if test_response.ok else {}
-                        test_error_msg = test_data.get("error") or (test_data.get("detail") if not test_response.ok else None)
+                        if not code_saved:
+                            await get_pool().execute("UPDATE board_queries SET python_code=$1 WHERE id=$2", generated_code, test_query_id)
+                        test_data = await _run_test_query(test_query_id, datastore_id)
+                        test_error_msg = test_data.get("error")
 
                         if not test_error_msg and test_data.get("result") is not None:
                             row_count = test_data.get("count", 0)
                             progress_log.append(f"Test passed! {row_count} rows")
+                            await _record_generation(generation_key, generated_code, passed=True)
                             return {
                                 "code": generated_code,
                                 "message": "Code generated and tested successfully!\n\n" + "\n".join(progress_log),
@@ -1271,6 +1704,8 @@ async def exploration_helper_with_testing(
                         else:
                             last_error = test_error_msg or "Unknown error"
                             progress_log.append(f"Test failed: {last_error}")
+                            failed_code_hashes.add(code_hash)
+                            await _record_generation(generation_key, generated_code, passed=False)
                             if attempt == max_attempts:
                                 return {
                                     "code": generated_code,
@@ -1312,16 +1747,17 @@ async def get_schema(
     connector_id: Optional[str] = Body(default=None),
     database: Optional[str] = Body(default=None),
     table: Optional[str] = Body(default=None),
+    refresh: bool = Body(default=False),
 ):
     try:
         ds_id = datastore_id or connector_id
         if not ds_id:
             raise HTTPException(status_code=400, detail="Missing datastore_id or connector_id")
-        pool = get_pool()
-        ds_row = await pool.fetchrow("SELECT * FROM datastores WHERE id = $1", ds_id)
-        if not ds_row:
+        if refresh:
+            invalidate_datastore_cache(ds_id)
+        datastore = await get_datastore(ds_id)
+        if not datastore:
             raise HTTPException(status_code=404, detail="Datastore not found")
-        datastore = dict(ds_row)
         if datastore["type"] == "bigquery":
             return await get_bigquery_schema(datastore, database, table)
         elif datastore["type"] == "postgres":
@@ -1329,12 +1765,32 @@ async def get_schema(
         else:
             raise HTTPException(status_code=400, detail=f"Unsupported datastore type: {datastore['type']}")
     except Exception as e:
-        import traceback; traceback.print_exc()
+        logger.exception("get_schema failed")
         if isinstance(e, HTTPException):
             raise e
         raise HTTPException(status_code=500, detail=f"Schema retrieval failed: {str(e)}")
 
 
+_TITLE_SYSTEM_INSTRUCTION = (
+    "You are a title generator. Given a user's message, create a concise, descriptive title (2-5 words max).\n"
+    "Rules:\n- Output ONLY the title text\n- No quotes, no markdown\n- Keep it short (2-5 words)\n- Use title case"
+)
+
+
+def _finish_title(raw_text: str, user_prompt: str) -> str:
+    raw_title = raw_text.strip().strip("\"'")
+    if not raw_title:
+        return user_prompt[:40] + ("..." if len(user_prompt) > 40 else "")
+    if len(raw_title) > 50:
+        raw_title = raw_title[:47] + "..."
+    return raw_title
+
+
+def _fallback_title(user_prompt: str) -> str:
+    words = user_prompt.split()
+    return " ".join(words[:5]) + ("..." if len(words) > 5 else "")
+
+
 @router.post("/generate-chat-title")
 async def generate_chat_title(
     request: Request,
@@ -1342,26 +1798,38 @@ async def generate_chat_title(
     context: str = Body(default="general"),
     gemini_api_key: Optional[str] = Body(default=None),
     model: str = Body(default=DEFAULT_MODEL),
+    stream: bool = Body(default=False),
 ):
     user = await get_optional_user(request)
     user_id = str(user["id"]) if user else None
+    messages = [{"role": "user", "content": f"Generate a title for this chat:\n\n{user_prompt}"}]
+
+    if stream:
+        async def generate_stream():
+            title = _fallback_title(user_prompt)
+            try:
+                async for chunk in stream_llm(
+                    model, messages, system_instruction=_TITLE_SYSTEM_INSTRUCTION, temperature=0.3, max_tokens=50,
+                ):
+                    if isinstance(chunk, LLMResponse):
+                        await _log_usage(user_id, None, chunk)
+                        title = _finish_title(chunk.text or "", user_prompt)
+                    else:
+                        yield _sse({"type": "title_delta", "content": chunk})
+            except Exception:
+                logger.exception("Title generation failed")
+            yield _sse({"type": "title", "title": title})
+
+        return StreamingResponse(
+            _abort_on_disconnect(request, generate_stream()),
+            media_type="text/event-stream",
+            headers=_SSE_HEADERS,
+        )
 
     try:
-        system_instruction = (
-            "You are a title generator. Given a user's message, create a concise, descriptive title (2-5 words max).\n"
-            "Rules:\n- Output ONLY the title text\n- No quotes, no markdown\n- Keep it short (2-5 words)\n- Use title case"
-        )
-        messages = [{"role": "user", "content": f"Generate a title for this chat:\n\n{user_prompt}"}]
-        resp = await call_llm(model, messages, system_instruction=system_instruction, temperature=0.3, max_tokens=50)
+        resp = await call_llm(model, messages, system_instruction=_TITLE_SYSTEM_INSTRUCTION, temperature=0.3, max_tokens=50)
         await _log_usage(user_id, None, resp)
-
-        raw_title = (resp.text or "").strip().strip('"').strip("'")
-        if not raw_title:
-            return {"title": user_prompt[:40] + ("..." if len(user_prompt) > 40 else "")}
-        if len(raw_title) > 50:
-            raw_title = raw_title[:47] + "..."
-        return {"title": raw_title}
-    except Exception as e:
-        print(f"Title generation error: {e}")
-        words = user_prompt.split()[:5]
-        return {"title": " ".join(words) + ("..." if len(user_prompt.split()) > 5 else "")}
+        return {"title": _finish_title(resp.text or "", user_prompt)}
+    except Exception:
+        logger.exception("Title generation failed")
+        return {"title": _fallback_title(user_prompt)}
@@ -6,6 +6,7 @@ from fastapi import APIRouter, HTTPException, Body, Depends, UploadFile, File, R
 from ..db import get_pool
 from ..auth import get_current_user
 from ..helpers import ensure_dict
+from ..query_engine import invalidate_datastore_cache
 from ..storage import get_storage_provider
 
 router = APIRouter(tags=["crud"])
@@ -255,6 +256,7 @@ async def update_datastore(datastore_id: str, request: Request, user=Depends(get
         raise HTTPException(400, "No fields to update")
     vals.append(datastore_id)
     await pool.execute(f"UPDATE datastores SET {', '.join(sets)} WHERE id = ${idx}", *vals)
+    invalidate_datastore_cache(datastore_id)
     row = await pool.fetchrow("SELECT * FROM datastores WHERE id = $1", datastore_id)
     if not row:
         return {}
@@ -267,6 +269,7 @@ async def update_datastore(datastore_id: str, request: Request, user=Depends(get
 async def delete_datastore(datastore_id: str, user=Depends(get_current_user)):
     pool = get_pool()
     await pool.execute("DELETE FROM datastores WHERE id = $1", datastore_id)
+    invalidate_datastore_cache(datastore_id)
     return {"success": True}
 
 
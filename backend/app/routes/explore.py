@@ -1,15 +1,19 @@
-from typing import Dict, Any, Optional
+import logging
+from typing import Dict, Any, Literal, Optional
 
-import pandas as pd
-from jinja2 import Template
+import orjson
 from fastapi import APIRouter, HTTPException, Body
+from fastapi.responses import Response, StreamingResponse
 
 from ..db import get_pool
-from ..helpers import ensure_dict
+from ..helpers import FastJSONResponse, dataframe_to_arrow_ipc, ensure_dict, stream_json_records
 from ..query_engine import (
-    get_bigquery_client, get_sa_engine, execute_python_query, SA_TYPES,
+    get_bigquery_client, get_datastore, get_executor, get_sa_engine, execute_python_query,
+    ping_bigquery, ping_postgres, ping_sql_engine, render_sql_template, run_blocking, SA_TYPES,
 )
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(tags=["explore"])
 
 
@@ -17,24 +21,38 @@ router = APIRouter(tags=["explore"])
 async def explore(
     query_id: str = Body(...),
     args: Dict[str, Any] = Body(default={}),
-    datastore_id: Optional[str] = Body(default=None)
+    datastore_id: Optional[str] = Body(default=None),
+    orient: Literal["records", "columns"] = Body(default="records"),
 ):
     """
     Executes a Python query with embedded queries.
     Datastore ID is optional - will auto-select first available datastore if not provided or invalid.
+    orient="columns" returns result/table as {column: [values...]} instead of a list of rows.
     Returns: {"result": [...], "error": null} or {"result": null, "error": "error message"}
     """
+    # Returned as a Response so FastAPI skips its jsonable_encoder walk over every row
+    result = await run_explore(query_id, args, datastore_id, orient)
+    try:
+        return FastJSONResponse(result)
+    except orjson.JSONEncodeError as e:
+        # e.g. integers wider than 64 bits, which orjson rejects before any fallback
+        return FastJSONResponse({"result": None, "error": f"Result could not be encoded as JSON: {e}"})
+
+
+async def run_explore(
+    query_id: str, args: Dict[str, Any], datastore_id: Optional[str], orient: str = "records",
+) -> Dict[str, Any]:
+    """Body of /explore, callable in-process (used by the AI exploration loop to test generated code)."""
     try:
         pool = get_pool()
-        query_row = await pool.fetchrow("SELECT * FROM board_queries WHERE id = $1", query_id)
+        query_row = await pool.fetchrow("SELECT python_code FROM board_queries WHERE id = $1", query_id)
         if not query_row:
             return {"result": None, "error": "Query not found"}
 
-        query = dict(query_row)
-        python_code = query.get("python_code", "")
+        python_code = query_row["python_code"] or ""
 
         exec_result = await execute_python_query(
-            python_code, args=args, datastore_id=datastore_id, limit_rows=0
+            python_code, args=args, datastore_id=datastore_id, limit_rows=0, orient=orient,
         )
 
         if not exec_result.get("success"):
@@ -49,8 +67,7 @@ async def explore(
         }
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("explore failed for query %s", query_id)
         return {"result": None, "error": f"Query execution failed: {str(e)}"}
 
 
@@ -78,22 +95,23 @@ async def test_datastore(
 
         if ds_type == "bigquery":
             client = await get_bigquery_client(ds_config)
-            client.list_datasets(max_results=1)
+            await run_blocking(ping_bigquery, client)
+            return {"status": "success", "message": "Connection successful"}
+
+        elif ds_type == "postgres" and ds_config.get("connection_string"):
+            await ping_postgres(ds_config["connection_string"])
             return {"status": "success", "message": "Connection successful"}
 
         elif ds_type in SA_TYPES:
-            import sqlalchemy as sa
             engine = get_sa_engine(ds_type, ds_config)
-            with engine.connect() as conn:
-                conn.execute(sa.text("SELECT 1"))
+            await run_blocking(ping_sql_engine, engine)
             return {"status": "success", "message": "Connection successful"}
 
         else:
             raise HTTPException(status_code=400, detail=f"Unsupported datastore type: {ds_type}")
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("test-datastore failed")
         raise HTTPException(status_code=500, detail=f"Test failed: {str(e)}")
 
 
@@ -101,55 +119,48 @@ async def test_datastore(
 async def query(
     datastore_id: str = Body(...),
     sql: str = Body(...),
-    args: Dict[str, Any] = Body(default={})
+    args: Dict[str, Any] = Body(default={}),
+    result_format: Literal["records", "columns", "arrow"] = Body(default="records", alias="format"),
 ):
     """
     Execute a direct SQL query against a datastore.
     Supports templating with Jinja2.
+    format="columns" returns table as {column: [values...]}; format="arrow"
+    returns the result as an Arrow IPC stream instead of JSON.
     """
     try:
-        print(f"DEBUG: Executing query on datastore_id={datastore_id}")
-
-        pool = get_pool()
-        store_row = await pool.fetchrow("SELECT * FROM datastores WHERE id = $1", datastore_id)
-        if not store_row:
+        datastore = await get_datastore(datastore_id)
+        if not datastore:
             raise HTTPException(status_code=404, detail="Datastore not found")
-        datastore = dict(store_row)
 
         try:
-            template = Template(sql)
-            rendered_sql = template.render(**args)
+            rendered_sql = render_sql_template(sql, args)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Template error: {str(e)}")
 
-        print(f"DEBUG: Rendered SQL: {rendered_sql[:200]}...")
+        logger.debug("Rendered SQL for datastore %s: %.200s", datastore_id, rendered_sql)
 
-        ds_config = ensure_dict(datastore["config"])
-        ds_type = datastore["type"]
+        executor = await get_executor(datastore)
+        df = await executor(rendered_sql)
 
-        if ds_type == "bigquery":
-            client = await get_bigquery_client(ds_config)
-            query_job = client.query(rendered_sql)
-            results = query_job.result()
-            df = pd.DataFrame([dict(row.items()) for row in results])
-
-        elif ds_type in SA_TYPES:
-            engine = get_sa_engine(ds_type, ds_config)
-            df = pd.read_sql(rendered_sql, engine)
+        if result_format == "arrow":
+            return Response(dataframe_to_arrow_ipc(df), media_type="application/vnd.apache.arrow.stream")
+        if result_format == "columns":
+            return FastJSONResponse({
+                "status": "success",
+                "table": {str(name): col.tolist() for name, col in df.items()},
+                "count": len(df),
+                "columns": [str(c) for c in df.columns],
+            })
 
-        else:
-            raise HTTPException(status_code=400, detail=f"Unsupported datastore type: {ds_type}")
-
-        return {
-            "status": "success",
-            "table": df.to_dict(orient='records'),
-            "count": len(df),
-            "columns": list(df.columns)
-        }
+        # Stream the rows so neither the record list nor the encoded body is held whole
+        head = b'{"status":"success","count":%d,"columns":%s,"table":' % (
+            len(df), orjson.dumps([str(c) for c in df.columns]),
+        )
+        return StreamingResponse(stream_json_records(df, head, b'}'), media_type="application/json")
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
         if isinstance(e, HTTPException):
             raise e
+        logger.exception("query failed on datastore %s", datastore_id)
         raise HTTPException(status_code=500, detail=f"Query failed: {str(e)}")
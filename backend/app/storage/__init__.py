@@ -1,3 +1,4 @@
+import functools
 import os
 from abc import ABC, abstractmethod
 
@@ -19,7 +20,9 @@ class StorageProvider(ABC):
         ...
 
 
+@functools.lru_cache(maxsize=None)
 def get_storage_provider() -> StorageProvider:
+    """Return the process-wide storage provider (one GCS client / bucket handle per worker)."""
     provider = os.getenv("STORAGE_PROVIDER", "local").lower()
     if provider == "gcs":
         from .gcs import GCSStorageProvider
@@ -1,3 +1,4 @@
+import asyncio
 import os
 from . import StorageProvider
 
@@ -22,13 +23,13 @@ class GCSStorageProvider(StorageProvider):
 
     async def upload(self, bucket: str, path: str, data: bytes, content_type: str = "application/octet-stream") -> str:
         blob = self._get_bucket().blob(self._blob_path(bucket, path))
-        blob.upload_from_string(data, content_type=content_type)
+        await asyncio.to_thread(blob.upload_from_string, data, content_type=content_type)
         return path
 
     async def download(self, bucket: str, path: str) -> bytes:
         blob = self._get_bucket().blob(self._blob_path(bucket, path))
-        return blob.download_as_bytes()
+        return await asyncio.to_thread(blob.download_as_bytes)
 
     async def delete(self, bucket: str, path: str) -> None:
         blob = self._get_bucket().blob(self._blob_path(bucket, path))
-        blob.delete()
+        await asyncio.to_thread(blob.delete)
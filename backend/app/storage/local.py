@@ -1,3 +1,4 @@
+import asyncio
 import os
 from pathlib import Path
 from . import StorageProvider
@@ -15,14 +16,14 @@ class LocalStorageProvider(StorageProvider):
         return full
 
     async def upload(self, bucket: str, path: str, data: bytes, content_type: str = "application/octet-stream") -> str:
-        self._path(bucket, path).write_bytes(data)
+        await asyncio.to_thread(self._path(bucket, path).write_bytes, data)
         return path
 
     async def download(self, bucket: str, path: str) -> bytes:
         fp = self._path(bucket, path)
         if not fp.exists():
             raise FileNotFoundError(f"File not found: {bucket}/{path}")
-        return fp.read_bytes()
+        return await asyncio.to_thread(fp.read_bytes)
 
     async def delete(self, bucket: str, path: str) -> None:
         fp = self._path(bucket, path)
@@ -5,6 +5,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 from app.db import init_pool, close_pool
+from app.helpers import FastJSONResponse
+from app.http_client import init_client, close_client
 from app.routes.auth import router as auth_router
 from app.routes.explore import router as explore_router
 from app.routes.ai import router as ai_router
@@ -16,10 +18,12 @@ load_dotenv()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_pool()
+    await init_client()
     yield
+    await close_client()
     await close_pool()
 
-app = FastAPI(title="Nubi Exploration Engine", lifespan=lifespan)
+app = FastAPI(title="Nubi Exploration Engine", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
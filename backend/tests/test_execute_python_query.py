@@ -0,0 +1,39 @@
+import asyncio
+
+from fastapi import HTTPException
+
+from app import query_engine
+
+DATASTORE_ID = "00000000-0000-0000-0000-000000000001"
+
+CODE = f"""
+# @node: slow
+# @type: query
+# @datastore: {DATASTORE_ID}
+# @query: SELECT 1
+# @node: broken
+# @type: query
+# @datastore: {DATASTORE_ID}
+# @query: SELECT nope
+result = slow
+"""
+
+
+def test_sibling_failure_reports_the_sql_error(monkeypatch):
+    async def noop(datastore_ids):
+        return None
+
+    async def fake_run_query_logic(datastore_id, query_template, context):
+        if query_template == "SELECT nope":
+            raise HTTPException(status_code=400, detail="Query error: column nope does not exist")
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(query_engine, "prefetch_datastores", noop)
+    monkeypatch.setattr(query_engine, "run_query_logic", fake_run_query_logic)
+
+    result = asyncio.run(query_engine.execute_python_query(CODE))
+
+    assert result == {
+        "success": False,
+        "error": "SQL error in 'broken': Query error: column nope does not exist",
+    }
@@ -0,0 +1,11 @@
+-- Exploration task memory: query code that passed its test, keyed by a hash of
+-- the request (model, prompt, current code, schema summary, recent chat), with
+-- pass/fault counts used to decide whether it is still worth reusing
+CREATE TABLE IF NOT EXISTS public.exploration_memory (
+    request_hash TEXT PRIMARY KEY,
+    code TEXT NOT NULL,
+    pass_count INTEGER NOT NULL DEFAULT 0,
+    fault_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
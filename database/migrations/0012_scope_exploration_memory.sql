@@ -0,0 +1,4 @@
+-- Exploration memory keys now include the datastore and requesting user.
+-- Entries hashed under the old unscoped key could be recalled across tenants;
+-- drop them rather than leave them reachable.
+DELETE FROM public.exploration_memory;
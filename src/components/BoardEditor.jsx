@@ -564,6 +564,15 @@ export default function BoardEditor() {
                         } else if (data.type === 'progress') {
                             streamingMessage.progress = [...(streamingMessage.progress || []), data.content]
                             setChatMessages(prev => [...prev.slice(0, -1), { ...streamingMessage }])
+                        } else if (data.type === 'validation_report') {
+                            streamingMessage.progress = [
+                                ...(streamingMessage.progress || []),
+                                data.summary,
+                                ...(data.errors || []).map(err => `  Error: ${err}`),
+                                ...(data.warnings || []).map(warn => `  Warning: ${warn}`),
+                                ...(data.info || []).map(item => `  ${item}`),
+                            ]
+                            setChatMessages(prev => [...prev.slice(0, -1), { ...streamingMessage }])
                         } else if (data.type === 'code_delta') {
                             streamingMessage.code_delta = { old_code: data.old_code, new_code: data.new_code }
                             finalCode = data.new_code
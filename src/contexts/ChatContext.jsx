@@ -137,7 +137,7 @@ export function ChatProvider({ children }) {
         return data.id
     }, [currentChatId, boardId, currentOrg?.id])
 
-    const generateChatTitle = useCallback(async (userPrompt, context) => {
+    const generateChatTitle = useCallback(async (userPrompt, context, onPartialTitle) => {
         try {
             const backendUrl = import.meta.env.VITE_BACKEND_URL || 'http://localhost:8000'
             const token = localStorage.getItem('nubi_token')
@@ -150,12 +150,35 @@ export function ChatProvider({ children }) {
                     user_prompt: userPrompt,
                     context: context,
                     model: selectedModel,
+                    stream: true,
                 })
             })
             
             if (response.ok) {
-                const data = await response.json()
-                return data.title
+                const reader = response.body.getReader()
+                const decoder = new TextDecoder()
+                let buffer = ''
+                let partial = ''
+                let title = null
+                while (true) {
+                    const { done, value } = await reader.read()
+                    if (done) break
+                    buffer += decoder.decode(value, { stream: true })
+                    const lines = buffer.split('\n')
+                    buffer = lines.pop() || ''
+                    for (const line of lines) {
+                        if (!line.startsWith('data: ')) continue
+                        let data
+                        try { data = JSON.parse(line.slice(6)) } catch { continue }
+                        if (data.type === 'title_delta') {
+                            partial += data.content
+                            onPartialTitle?.(partial)
+                        } else if (data.type === 'title') {
+                            title = data.title
+                        }
+                    }
+                }
+                if (title) return title
             }
         } catch (err) {
             console.error('Error generating title:', err)
@@ -439,6 +462,18 @@ export function ChatProvider({ children }) {
                     } else if (data.type === 'progress') {
                         streamingMessage.progress = [...(streamingMessage.progress || []), data.content]
                         setChatMessages(prev => [...prev.slice(0, -1), { ...streamingMessage }])
+                    } else if (data.type === 'validation_report') {
+                        streamingMessage.progress = [
+                            ...(streamingMessage.progress || []),
+                            data.summary,
+                            ...(data.errors || []).map(err => `  Error: ${err}`),
+                            ...(data.warnings || []).map(warn => `  Warning: ${warn}`),
+                            ...(data.info || []).map(item => `  ${item}`),
+                        ]
+                        setChatMessages(prev => [...prev.slice(0, -1), { ...streamingMessage }])
+                    } else if (data.type === 'text_delta') {
+                        streamingMessage.content += data.content
+                        setChatMessages(prev => [...prev.slice(0, -1), { ...streamingMessage }])
                     } else if (data.type === 'code_delta') {
                         streamingMessage.code_delta = { old_code: data.old_code, new_code: data.new_code }
                         setChatMessages(prev => [...prev.slice(0, -1), { ...streamingMessage }])
@@ -485,18 +520,29 @@ export function ChatProvider({ children }) {
             return
         }
 
+        // Title generation is independent of the reply; start it before reading attachments
+        // so it overlaps with file reads, mention lookups and the main stream.
+        if (isFirstMessage) {
+            const showTitle = (title) => setChatList((prev) => prev.map(c => c.id === chatId ? { ...c, title } : c))
+            generateChatTitle(prompt, pageContext.type || 'general', showTitle).then(async (title) => {
+                showTitle(title)
+                try {
+                    await api.chats.update(chatId, title)
+                } catch (err) {
+                    console.error('Error updating chat title:', err)
+                }
+            })
+        }
+
         let fileContext = ''
         if (attachedFiles.length > 0) {
             const fileNames = attachedFiles.map(f => f.name).join(', ')
             fileContext = `\n\n[Attached files: ${fileNames}]`
-            for (const file of attachedFiles) {
-                if (file.type === 'application/json' || file.name.endsWith('.json') || file.name.endsWith('.csv') || file.name.endsWith('.txt') || file.name.endsWith('.sql')) {
-                    try {
-                        const text = await file.text()
-                        fileContext += `\n\n--- File: ${file.name} ---\n${text.slice(0, 10000)}`
-                    } catch {}
-                }
-            }
+            const textFiles = attachedFiles.filter(file => file.type === 'application/json' || file.name.endsWith('.json') || file.name.endsWith('.csv') || file.name.endsWith('.txt') || file.name.endsWith('.sql'))
+            const texts = await Promise.all(textFiles.map(file => file.text().catch(() => null)))
+            textFiles.forEach((file, i) => {
+                if (texts[i] !== null) fileContext += `\n\n--- File: ${file.name} ---\n${texts[i].slice(0, 10000)}`
+            })
         }
 
         const fullPrompt = prompt + fileContext
@@ -510,17 +556,6 @@ export function ChatProvider({ children }) {
         setChatLoading(true)
 
         try {
-            if (isFirstMessage) {
-                generateChatTitle(prompt, pageContext.type || 'general').then(async (title) => {
-                    try {
-                        await api.chats.update(chatId, title)
-                        setChatList((prev) => prev.map(c => c.id === chatId ? { ...c, title } : c))
-                    } catch (err) {
-                        console.error('Error updating chat title:', err)
-                    }
-                })
-            }
-
             const mentions = parseMentions(fullPrompt)
             const mentionedContext = mentions.length > 0 ? await fetchMentionedContext(mentions) : []
 